@@ -1,16 +1,22 @@
 # books/admin.py
 from django.contrib import admin
-from .models import Category, Book, StudentProfile, BookBorrow, StudentQuery, BookRequest
+from .models import Category, Section, Book, StudentProfile, BookBorrow, StudentQuery, BookRequest
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
+@admin.register(Section)
+class SectionAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'category_name', 'section', 'location', 'available')
-    list_filter = ('category_name', 'section', 'available')
+    list_display = ('title', 'author', 'category', 'section', 'location', 'available')
+    list_filter = ('category', 'section', 'available')
+    list_select_related = ('category', 'section')
     search_fields = ('title', 'author')
 
 @admin.register(StudentProfile)
@@ -20,7 +26,7 @@ class StudentProfileAdmin(admin.ModelAdmin):
 
 @admin.register(BookBorrow)
 class BookBorrowAdmin(admin.ModelAdmin):
-    list_display = ('user', 'book', 'borrowed_date', 'due_date', 'status')
+    list_display = ('user', 'book', 'borrowed_date', 'due_date', 'returned_date', 'status')
     list_filter = ('status', 'due_date')
     search_fields = ('user__username', 'book__title')
 
@@ -0,0 +1,144 @@
+# books/chat_batcher.py
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingQuery:
+    __slots__ = ('text', 'k', 'done', 'result', 'error')
+
+    def __init__(self, text, k):
+        self.text = text
+        self.k = k
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ChatBatcher:
+    """
+    Coalesces concurrent chat queries into one `encode` and one FAISS
+    `search` call.
+
+    Request threads call `search()` and block. A single background thread
+    collects queries until `max_batch_size` are waiting or `max_wait`
+    seconds have passed since the first one arrived, runs the batch, and
+    hands each caller its own row of the results. With
+    `max_batch_size=1` every query runs on its own, like before.
+
+    With a `cache` (query_cache.ChatCache) and `get_version`, repeated
+    queries are answered without queueing at all, and only queries whose
+    embedding is not cached are sent to the model.
+    """
+
+    def __init__(self, get_model, get_index, max_batch_size=32, max_wait=0.005,
+                 cache=None, get_version=None):
+        self.get_model = get_model
+        self.get_index = get_index
+        self.cache = cache
+        self.get_version = get_version
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.batches = 0
+        self.queries = 0
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='chat-batcher', daemon=True)
+            self._thread.start()
+
+    def search(self, text, k):
+        """
+        Returns (distances, ids) for `text`, as 1-D arrays of length `k`
+        (ids are -1 where FAISS found nothing). Raises whatever the batch
+        raised, e.g. RuntimeError if the model or index is unavailable.
+        """
+        if self.cache is not None:
+            cached = self.cache.get_results(text, k, self.get_version())
+            if cached is not None:
+                return cached
+
+        pending = _PendingQuery(text, k)
+        with self._cond:
+            self._ensure_thread()
+            self._queue.append(pending)
+            self._cond.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[:self.max_batch_size]
+            del self._queue[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                logger.error(f"Chat batch of {len(batch)} failed: {e}")
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def _run_batch(self, batch):
+        import numpy as np
+
+        # Read the version before the index: if a reload lands in between,
+        # results get cached under the older version and are simply dropped.
+        version = self.get_version() if self.cache is not None else None
+        model = self.get_model()
+        index = self.get_index()
+        if model is None or index is None:
+            raise RuntimeError('Model or index not loaded.')
+
+        vectors = [None] * len(batch)
+        if self.cache is not None:
+            for row, pending in enumerate(batch):
+                vectors[row] = self.cache.get_embedding(pending.text)
+        missing = [row for row, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = model.encode([batch[row].text for row in missing])
+            for row, vector in zip(missing, encoded):
+                vectors[row] = vector
+                if self.cache is not None:
+                    self.cache.put_embedding(batch[row].text, vector)
+
+        k = max(pending.k for pending in batch)
+        distances, ids = index.search(np.asarray(vectors, dtype='float32'), k)
+        for row, pending in enumerate(batch):
+            pending.result = (distances[row, :pending.k], ids[row, :pending.k])
+            if self.cache is not None:
+                self.cache.put_results(pending.text, pending.k, version, pending.result)
+
+        self.batches += 1
+        self.queries += len(batch)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'queries': self.queries,
+            'avg_batch_size': self.queries / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
@@ -0,0 +1,144 @@
+# books/circulation.py
+"""
+Checkout and return of books.
+
+Both are a conditional UPDATE followed by an INSERT/UPDATE of the borrow
+record, in one short transaction:
+
+    UPDATE books_book SET available = false WHERE id = %s AND available = true
+
+The database decides the winner. Of any number of concurrent checkouts of
+a book, exactly one UPDATE matches the row (rowcount 1); the others wait
+for its row lock, re-check the WHERE clause against the committed row and
+match nothing (rowcount 0). Nothing is read first and written back later,
+and the row lock is only held until the borrow record is written.
+
+checkout_many/return_many do the same for a stack of books in a fixed
+number of statements whatever its size: the rows are locked with SELECT
+... FOR UPDATE (in id order, so two batches can't deadlock), then changed
+with one bulk UPDATE and one bulk INSERT. The locks are held only for
+that transaction.
+
+moderate_requests approves/rejects pending BookRequests the same way.
+
+Availability is changed with QuerySet.update(), so no post_save signal
+(embedding queue, typeahead index) fires; neither cares about it.
+"""
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import Book, BookBorrow, BookRequest
+
+# Outcomes of checkout() / return_book().
+DONE = 'done'
+NOT_FOUND = 'not_found'
+UNAVAILABLE = 'unavailable'      # checkout: someone else has the book
+NOT_BORROWED = 'not_borrowed'    # return: no open borrow (by this user)
+NOT_PENDING = 'not_pending'      # moderation: already approved/rejected
+
+
+def checkout(book_id, user, due_date):
+    """Lends the book to `user` if it is available. Returns (outcome, BookBorrow or None)."""
+    with transaction.atomic():
+        if not Book.objects.filter(pk=book_id, available=True).update(available=False):
+            return (UNAVAILABLE if Book.objects.filter(pk=book_id).exists() else NOT_FOUND), None
+        borrow = BookBorrow.objects.create(book_id=book_id, user=user, due_date=due_date)
+    return DONE, borrow
+
+
+def return_book(book_id, user=None):
+    """
+    Closes the open borrow of the book (only `user`'s, unless user is None,
+    e.g. for desk staff) and makes the book available again. Returns the
+    outcome.
+    """
+    borrows = BookBorrow.objects.filter(book_id=book_id, status='BORROWED')
+    if user is not None:
+        borrows = borrows.filter(user=user)
+    with transaction.atomic():
+        if not borrows.update(status='RETURNED', returned_date=timezone.localdate()):
+            return NOT_BORROWED if Book.objects.filter(pk=book_id).exists() else NOT_FOUND
+        Book.objects.filter(pk=book_id).update(available=True)
+    return DONE
+
+
+def checkout_many(book_ids, user, due_date):
+    """
+    Lends every available book of `book_ids` to `user` in one transaction.
+    Returns [(book_id, outcome, title or None)] in input order, duplicates
+    dropped.
+    """
+    ids = list(dict.fromkeys(book_ids))
+    with transaction.atomic():
+        books = {
+            book_id: (title, available) for book_id, title, available in
+            Book.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('id', 'title', 'available')
+        }
+        won = [book_id for book_id in ids if book_id in books and books[book_id][1]]
+        if won:
+            # Can't miss with the rows locked; checked anyway for backends
+            # without FOR UPDATE, so a lost race rolls back instead of double-lending.
+            if Book.objects.filter(pk__in=won, available=True).update(available=False) != len(won):
+                raise DatabaseError('Book availability changed during a batch checkout.')
+            BookBorrow.objects.bulk_create([
+                BookBorrow(book_id=book_id, user=user, due_date=due_date) for book_id in won
+            ])
+
+    won = set(won)
+    return [
+        (book_id, NOT_FOUND, None) if book_id not in books else
+        (book_id, DONE if book_id in won else UNAVAILABLE, books[book_id][0])
+        for book_id in ids
+    ]
+
+
+def return_many(book_ids, user=None):
+    """
+    Closes the open borrows of `book_ids` (only `user`'s, unless user is
+    None) in one transaction and makes those books available again.
+    Returns [(book_id, outcome, title or None)] in input order, duplicates
+    dropped.
+    """
+    ids = list(dict.fromkeys(book_ids))
+    borrows = BookBorrow.objects.select_for_update().filter(book_id__in=ids, status='BORROWED')
+    if user is not None:
+        borrows = borrows.filter(user=user)
+    with transaction.atomic():
+        open_borrows = dict(borrows.order_by('pk').values_list('id', 'book_id'))
+        if open_borrows:
+            BookBorrow.objects.filter(pk__in=open_borrows).update(
+                status='RETURNED', returned_date=timezone.localdate())
+            Book.objects.filter(pk__in=set(open_borrows.values())).update(available=True)
+
+    returned = set(open_borrows.values())
+    titles = dict(Book.objects.filter(pk__in=ids).values_list('id', 'title'))
+    return [
+        (book_id, NOT_FOUND, None) if book_id not in titles else
+        (book_id, DONE if book_id in returned else NOT_BORROWED, titles[book_id])
+        for book_id in ids
+    ]
+
+
+def moderate_requests(request_ids, new_status):
+    """
+    Sets the PENDING requests among `request_ids` to `new_status` in one
+    transaction; approving makes their books available again. Returns
+    [(request_id, outcome)] in input order, duplicates dropped.
+    """
+    ids = list(dict.fromkeys(request_ids))
+    with transaction.atomic():
+        pending = dict(
+            BookRequest.objects.select_for_update().filter(pk__in=ids, status='PENDING')
+            .order_by('pk').values_list('id', 'book_id')
+        )
+        if pending:
+            BookRequest.objects.filter(pk__in=pending).update(status=new_status)
+            if new_status == 'APPROVED':
+                Book.objects.filter(pk__in=set(pending.values())).update(available=True)
+
+    rest = [request_id for request_id in ids if request_id not in pending]
+    existing = set(BookRequest.objects.filter(pk__in=rest).values_list('id', flat=True)) if rest else set()
+    return [
+        (request_id, DONE if request_id in pending else NOT_PENDING if request_id in existing else NOT_FOUND)
+        for request_id in ids
+    ]
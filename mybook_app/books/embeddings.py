@@ -0,0 +1,103 @@
+# books/embeddings.py
+import hashlib
+import logging
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+# This is the name of the pre-trained AI model we'll use everywhere
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# --- Binary storage format of Book.embedding ---
+# header: magic b'BEMB', dtype code (uint8), dimension (uint16),
+#         model-name length (uint8), little-endian; then the model name (utf-8);
+#         then, for int8 only, one float32 scale; then `dimension` values.
+# float32 is exact and decodes with a zero-copy np.frombuffer; float16 halves
+# and int8 (symmetric, per-vector scale) quarters the size at a small loss.
+EMBEDDING_MAGIC = b'BEMB'
+_HEADER = struct.Struct('<4sBHB')
+_DTYPES = {'float32': 0, 'float16': 1, 'int8': 2}
+_DTYPE_NAMES = {code: name for name, code in _DTYPES.items()}
+
+_model = None
+_load_failed = False
+_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Returns the process-wide SentenceTransformer, loading it on first use.
+    Chat, the index worker and the management commands all share this one
+    instance, so each process carries a single copy of the weights.
+    Returns None if the model could not be loaded; the failure is logged
+    once and not retried. torch/sentence-transformers are only imported
+    here, so code paths that never embed anything don't pay for them.
+    """
+    global _model, _load_failed
+    if _model is not None or _load_failed:
+        return _model
+
+    with _lock:
+        if _model is None and not _load_failed:
+            try:
+                from sentence_transformers import SentenceTransformer
+
+                logger.info(f"Loading SentenceTransformer model {MODEL_NAME}...")
+                _model = SentenceTransformer(MODEL_NAME)
+                logger.info("Model loaded successfully.")
+            except Exception as e:
+                _load_failed = True
+                logger.error(f"Error loading SentenceTransformer model: {e}")
+    return _model
+
+
+def description_hash(text):
+    """
+    Fingerprint of what an embedding was computed from. The model name is
+    part of it, so switching models invalidates every stored embedding.
+    """
+    return hashlib.sha256(f'{MODEL_NAME}\n{text}'.encode('utf-8')).hexdigest()
+
+
+def pack_embedding(vector, dtype='float32', model_name=MODEL_NAME):
+    """Encodes a 1-D vector into the binary format above."""
+    import numpy as np
+
+    vector = np.asarray(vector, dtype='float32').ravel()
+    name = model_name.encode('utf-8')
+    parts = [_HEADER.pack(EMBEDDING_MAGIC, _DTYPES[dtype], vector.shape[0], len(name)), name]
+    if dtype == 'int8':
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        parts.append(struct.pack('<f', scale))
+        parts.append(np.round(vector / scale).astype('int8').tobytes())
+    else:
+        parts.append(vector.astype('<' + ('f4' if dtype == 'float32' else 'f2')).tobytes())
+    return b''.join(parts)
+
+
+def embedding_dtype(data):
+    """Storage dtype ('float32', 'float16' or 'int8') of a packed embedding."""
+    return _DTYPE_NAMES[_HEADER.unpack_from(data)[1]]
+
+
+def unpack_embedding(data):
+    """
+    Returns (model_name, float32 vector) for bytes written by pack_embedding.
+    float32 payloads are a read-only view over `data` (no copy).
+    """
+    import numpy as np
+
+    magic, code, dim, name_len = _HEADER.unpack_from(data)
+    if magic != EMBEDDING_MAGIC:
+        raise ValueError('Not a packed embedding.')
+    offset = _HEADER.size + name_len
+    model_name = bytes(data[_HEADER.size:offset]).decode('utf-8')
+
+    dtype = _DTYPE_NAMES[code]
+    if dtype == 'float32':
+        return model_name, np.frombuffer(data, dtype='<f4', count=dim, offset=offset)
+    if dtype == 'float16':
+        return model_name, np.frombuffer(data, dtype='<f2', count=dim, offset=offset).astype('float32')
+    (scale,) = struct.unpack_from('<f', data, offset)
+    return model_name, np.frombuffer(data, dtype='int8', count=dim, offset=offset + 4).astype('float32') * scale
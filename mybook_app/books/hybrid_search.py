@@ -0,0 +1,144 @@
+# books/hybrid_search.py
+"""
+Hybrid (lexical + semantic) ranked search behind /api/books/semantic-search/.
+
+* Lexical: the full-text index from search.py, scored by `relevance`.
+* Semantic: the FAISS index, scored by L2 distance to the query embedding.
+
+Filters (availability, section, category) are applied by the database for
+the lexical side and *inside* the FAISS search for the semantic side: the
+matching Book IDs become an ID selector, so FAISS only ever ranks allowed
+vectors and every result it returns can be used. When most books match, the
+selector is built from the books that don't (IDSelectorNot), which keeps it
+small for the common `available=true` case.
+
+The two rankings are fused with reciprocal rank fusion (RRF): each list
+contributes weight / (RRF_K + rank). Ranks rather than raw scores are
+combined because L2 distances and bm25/MATCH scores aren't on comparable
+scales.
+
+numpy/faiss are imported inside the functions that need them, so that
+importing this module (which views.py does at startup) stays cheap.
+"""
+from .search import search_books
+
+RRF_K = 60
+SEMANTIC_WEIGHT = 1.0
+LEXICAL_WEIGHT = 1.0
+
+
+def filter_books(queryset, available=None, section=None, category=None):
+    """Same matching rules as the book list (exact section/category names)."""
+    if available is not None:
+        queryset = queryset.filter(available=available)
+    if section:
+        queryset = queryset.filter(section__name=section)
+    if category:
+        queryset = queryset.filter(category__name=category)
+    return queryset
+
+
+def _ids(queryset):
+    import numpy as np
+
+    return np.fromiter(queryset.values_list('id', flat=True).iterator(), dtype='int64')
+
+
+def id_selector(queryset, total):
+    """
+    A FAISS selector admitting exactly the books in `queryset`. `total` is
+    the number of vectors in the index, used to pick the smaller side.
+    Returns (selector, matching) where matching is the number of admitted
+    books, or (None, 0) if none match.
+    """
+    import faiss
+
+    matching = queryset.count()
+    if not matching:
+        return None, 0
+    if matching <= total // 2:
+        return faiss.IDSelectorBatch(_ids(queryset)), matching
+    excluded = queryset.model.objects.exclude(pk__in=queryset.values('pk'))
+    return faiss.IDSelectorNot(faiss.IDSelectorBatch(_ids(excluded))), matching
+
+
+def search_parameters(index, selector, k):
+    """
+    SearchParameters carrying `selector`. Parameters passed to search()
+    replace the index's own nprobe/efSearch, so those are copied over
+    (efSearch is raised to k, or HNSW could not return k results).
+    """
+    import faiss
+
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    ivf = faiss.try_extract_index_ivf(inner)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(inner.hnsw.efSearch, k))
+    return faiss.SearchParameters(sel=selector)
+
+
+def vector_search(index, vector, k, queryset=None):
+    """
+    [(book_id, distance)] for the k nearest vectors, restricted to the books
+    in `queryset` if given (None means no restriction).
+    """
+    import numpy as np
+
+    k = min(k, index.ntotal)
+    if k <= 0:
+        return []
+    query = np.asarray(vector, dtype='float32').reshape(1, -1)
+    if queryset is None:
+        distances, ids = index.search(query, k)
+    else:
+        selector, matching = id_selector(queryset, index.ntotal)
+        if selector is None:
+            return []
+        k = min(k, matching)
+        distances, ids = index.search(query, k, params=search_parameters(index, selector, k))
+    return [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i != -1]
+
+
+def lexical_search(queryset, text, k):
+    """[(book_id, relevance)] of the best k full-text matches (relevance None on the icontains fallback)."""
+    matches = search_books(queryset, text)
+    if 'relevance' in matches.query.annotations:
+        rows = matches.order_by('-relevance', 'id').values_list('id', 'relevance')[:k]
+        return [(book_id, float(relevance)) for book_id, relevance in rows]
+    return [(book_id, None) for book_id in matches.order_by('id').values_list('id', flat=True)[:k]]
+
+
+def fuse(vector_hits, lexical_hits):
+    """
+    Reciprocal rank fusion. Returns [(book_id, score, distance, relevance)],
+    best first; distance/relevance are None for a list the book isn't in.
+    """
+    fused = {}
+    for rank, (book_id, distance) in enumerate(vector_hits):
+        fused[book_id] = [SEMANTIC_WEIGHT / (RRF_K + rank + 1), distance, None]
+    for rank, (book_id, relevance) in enumerate(lexical_hits):
+        entry = fused.setdefault(book_id, [0.0, None, None])
+        entry[0] += LEXICAL_WEIGHT / (RRF_K + rank + 1)
+        entry[2] = relevance
+    ranked = sorted(fused.items(), key=lambda item: (-item[1][0], item[0]))
+    return [(book_id, score, distance, relevance) for book_id, (score, distance, relevance) in ranked]
+
+
+def hybrid_search(queryset, text, k, offset=0, index=None, vector=None, filtered=False):
+    """
+    Ranks the books in `queryset` for `text`. Without `index`/`vector` only
+    the lexical side runs. `filtered` says whether `queryset` is narrower
+    than the whole catalogue, i.e. whether the vector search needs a selector.
+
+    Returns (hits, has_more) where hits is the fuse() output for ranks
+    offset .. offset + k.
+    """
+    depth = offset + k
+    vector_hits = []
+    if index is not None and vector is not None:
+        vector_hits = vector_search(index, vector, depth, queryset if filtered else None)
+    lexical_hits = lexical_search(queryset, text, depth)
+    fused = fuse(vector_hits, lexical_hits)
+    return fused[offset:depth], len(fused) > depth
@@ -0,0 +1,163 @@
+# books/index_manager.py
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def mmap_read_flags():
+    """
+    FAISS read flags for a shared, read-only mapping of the index file.
+    IO_FLAG_MMAP_IFC (faiss >= 1.9) maps the flat vector storage in place;
+    older releases only know IO_FLAG_MMAP, which covers inverted lists.
+    """
+    import faiss
+
+    mmap_flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+    return mmap_flag | faiss.IO_FLAG_READ_ONLY
+
+
+def apply_search_params(index, search_params):
+    """
+    Sets e.g. {'nprobe': 16, 'efSearch': 64} on `index`; each parameter is
+    applied to the index types that understand it (IVF and HNSW respectively).
+    """
+    import faiss
+
+    params = faiss.ParameterSpace()
+    for name, value in search_params.items():
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # not applicable to this index type (e.g. nprobe on HNSW)
+
+
+class IndexManager:
+    """
+    Owns the in-memory FAISS index used by the chat endpoint.
+
+    The index file is only ever replaced by an atomic rename (see
+    `indexing.write_index_atomic`), so a change in (mtime, inode) means a new
+    index was published. When that happens the file is loaded on a
+    background thread and swapped in; searches keep using the old index
+    until the swap, so they are never blocked by a reload. Only the first
+    load, when there is no index to fall back on, blocks: concurrent
+    callers wait for it instead of getting None.
+
+    With `mmap=True` (the default) the file is mapped read-only instead of
+    copied into each process, so every WSGI worker on the host shares the
+    same page-cache pages for the vectors. See `indexing.py` for the file
+    layout this relies on.
+    """
+
+    def __init__(self, path, check_interval=5.0, mmap=True, search_params=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.mmap = mmap
+        # e.g. {'nprobe': 16, 'efSearch': 64}; each is applied to the index
+        # types that understand it (IVF and HNSW respectively).
+        self.search_params = search_params or {}
+        self._index = None
+        self._file_version = None
+        self._last_check = float('-inf')
+        self._lock = threading.Lock()
+        self._first_load_lock = threading.Lock()
+        self._reloading = False
+
+        # Monitoring counters, see stats().
+        self.generation = 0
+        self.reload_count = 0
+        self.reload_failures = 0
+        self.last_reload_seconds = None
+        self.total_reload_seconds = 0.0
+
+    def _read_file_version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def _load(self, file_version):
+        import faiss
+
+        started = time.perf_counter()
+        try:
+            index = faiss.read_index(self.path, mmap_read_flags() if self.mmap else 0)
+            apply_search_params(index, self.search_params)
+        except Exception as e:
+            with self._lock:
+                self.reload_failures += 1
+                self._reloading = False
+            logger.error(f"Failed to load FAISS index from {self.path}: {e}")
+            return
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._index = index
+            self._file_version = file_version
+            self.generation += 1
+            self.reload_count += 1
+            self.last_reload_seconds = elapsed
+            self.total_reload_seconds += elapsed
+            self._reloading = False
+        logger.info(f"FAISS index generation {self.generation} loaded in {elapsed:.3f}s ({index.ntotal} vectors).")
+
+    def _first_load(self):
+        # Nothing to serve yet, so the load happens inline, and callers
+        # arriving meanwhile queue on the lock until it is done.
+        with self._first_load_lock:
+            if self._index is not None:
+                return
+            now = time.monotonic()
+            if now - self._last_check < self.check_interval:
+                return  # no file, or a failed load, moments ago
+            self._last_check = now
+
+            file_version = self._read_file_version()
+            if file_version is None:
+                return
+            with self._lock:
+                self._reloading = True
+            self._load(file_version)
+
+    def _maybe_reload(self):
+        if self._index is None:
+            self._first_load()
+            return
+
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        file_version = self._read_file_version()
+        if file_version is None or file_version == self._file_version:
+            return
+
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._load, args=(file_version,), daemon=True).start()
+
+    def get(self):
+        """Returns the current index (or None if no index file exists yet)."""
+        self._maybe_reload()
+        return self._index
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'mmap': self.mmap,
+            'loaded': self._index is not None,
+            'vectors': self._index.ntotal if self._index is not None else 0,
+            'generation': self.generation,
+            'reload_count': self.reload_count,
+            'reload_failures': self.reload_failures,
+            'reloading': self._reloading,
+            'last_reload_seconds': self.last_reload_seconds,
+            'total_reload_seconds': self.total_reload_seconds,
+        }
@@ -0,0 +1,470 @@
+# books/indexing.py
+"""
+Writer side of the FAISS index.
+
+On-disk layout of INDEX_FILE_PATH: a standard `faiss.write_index` dump of the
+index built by `build_index`, labelled with Book IDs (int64). With the
+default 'flat' type that is an `IndexIDMap` wrapping an `IndexFlatL2` whose
+float32 vectors are stored as one contiguous block. HNSW is also wrapped in
+an `IndexIDMap`; IVF/IVF-PQ store the IDs in their own inverted lists (an
+IDMap around an IVF index mislabels results after `remove_ids`). The
+approximate types (see INDEX_TYPES) trade exactness for sub-linear search
+on big catalogs.
+Readers map the file read-only (see `index_manager.IndexManager`), so it
+must never be modified in place: every writer builds the new index in memory and
+publishes it with `write_index_atomic`, which renames a fresh file over the
+old one. Processes still mapping the old inode keep a valid view until
+they reload. Writers hold `index_write_lock` from reading the file to
+publishing the new one, so one writer can't rename its copy over another's
+changes.
+
+numpy/faiss are imported inside the functions that need them so that
+importing this module (which signals.py does at startup) stays cheap.
+"""
+import logging
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .embeddings import description_hash, embedding_dtype, pack_embedding, unpack_embedding
+from .models import Book, PendingEmbedding
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_PATH = 'book_index.faiss'
+
+# Index types generate_embeddings can build, as faiss.index_factory strings.
+INDEX_TYPES = {
+    'flat': 'Flat',
+    'ivf': 'IVF{nlist},Flat',
+    'ivfpq': 'IVF{nlist},PQ{pq_m}',
+    'hnsw': 'HNSW{hnsw_m}',
+}
+
+
+def default_nlist(n):
+    """Roughly 4*sqrt(n) IVF cells, while keeping >= 39 training points per cell."""
+    return max(1, min(int(4 * n ** 0.5), n // 39))
+
+
+def index_type_of(index):
+    """Inverse of INDEX_TYPES for a loaded index (used to rebuild like-for-like)."""
+    import faiss
+
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return 'ivfpq'
+    if isinstance(inner, faiss.IndexIVF):
+        return 'ivf'
+    return 'flat'
+
+
+def create_index(d, n, index_type='flat', nlist=None, pq_m=16, hnsw_m=32):
+    """Returns an empty (possibly untrained) index for ~n vectors of dimension d that accepts add_with_ids."""
+    import faiss
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from: {', '.join(INDEX_TYPES)}.")
+
+    key = INDEX_TYPES[index_type].format(nlist=nlist or default_nlist(n), pq_m=pq_m, hnsw_m=hnsw_m)
+    index = faiss.index_factory(d, key)
+    if index_type in ('ivf', 'ivfpq'):
+        return index  # IVF keeps Book IDs in its inverted lists
+    return faiss.IndexIDMap(index)
+
+
+def index_ids(index):
+    """All Book IDs stored in `index`, as an int64 array."""
+    import numpy as np
+    import faiss
+
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map)
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    parts = [faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+             for l in range(ivf.nlist) if invlists.list_size(l)]
+    return np.concatenate(parts) if parts else np.empty(0, dtype='int64')
+
+
+def training_sample_size(index, n, train_sample=None):
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    return min(n, train_sample or (ivf.nlist if ivf is not None else 1) * 64)
+
+
+def build_index(embeddings, ids, index_type='flat', nlist=None, pq_m=16, hnsw_m=32, train_sample=None):
+    """
+    Builds an index of the requested type over `embeddings` (float32,
+    shape [n, d]) labelled with `ids`. IVF types are trained on a random
+    sample of at most `train_sample` vectors (default: 64 per IVF cell).
+    """
+    import numpy as np
+
+    n, d = embeddings.shape
+    index = create_index(d, n, index_type, nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m)
+
+    if not index.is_trained:
+        sample_size = training_sample_size(index, n, train_sample)
+        sample = embeddings
+        if sample_size < n:
+            sample = embeddings[np.random.default_rng(0).choice(n, sample_size, replace=False)]
+        index.train(sample)
+
+    index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
+    return index
+
+
+def _pack(vector):
+    return pack_embedding(vector, dtype=settings.EMBEDDING_STORAGE_DTYPE)
+
+
+def enqueue_book(book_id):
+    """
+    Marks a book as needing a fresh embedding. Re-queuing a book that is
+    already pending just bumps its timestamp, so bursts of edits coalesce.
+    """
+    PendingEmbedding.objects.update_or_create(
+        book_id=book_id, defaults={'queued_at': timezone.now()}
+    )
+
+
+def write_index_atomic(index, path=INDEX_FILE_PATH):
+    """
+    Writes the index to a temp file next to `path` and renames it into place,
+    so readers only ever see a complete old or a complete new file.
+    """
+    import faiss
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.book_index.', suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def iter_chunks(queryset, fields, chunk_size=1000):
+    """
+    Yields lists of `values_list(*fields)` rows (fields[0] must be 'id'),
+    walking the table in primary-key order with `id > last_id` queries.
+    Unlike a single big cursor this keeps memory bounded on every backend
+    (mysqlclient buffers whole result sets client-side).
+    """
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list(*fields)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def id_chunks(ids, size=1000):
+    """Splits `ids` into lists short enough for one `IN (...)` clause."""
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def has_description():
+    return Q(description__isnull=False) & ~Q(description='')
+
+
+def sync_embeddings(model, chunk_size=1000, batch_size=64, on_changed=None):
+    """
+    Streams books with a description in chunks and re-encodes only those
+    whose `description_hash` no longer matches, writing embedding + hash
+    back one chunk at a time. `on_changed(ids, vectors)` is called for every
+    chunk that had changes. Books that lost their description get their
+    embedding cleared.
+
+    Returns (seen_ids, encoded_count, cleared_ids) where seen_ids is an
+    int64 array of every book that should be in the index.
+    """
+    import numpy as np
+
+    seen, encoded = [], 0
+    for rows in iter_chunks(Book.objects.filter(has_description()), ('id', 'description', 'description_hash'), chunk_size):
+        seen.append(np.fromiter((row[0] for row in rows), dtype='int64', count=len(rows)))
+        changed = [(book_id, text, description_hash(text)) for book_id, text, stored in rows
+                   if stored != description_hash(text)]
+        if not changed:
+            continue
+
+        vectors = np.asarray(model.encode([text for _, text, _ in changed], batch_size=batch_size), dtype='float32')
+        Book.objects.bulk_update(
+            [Book(id=book_id, embedding=_pack(vector), description_hash=digest)
+             for (book_id, _, digest), vector in zip(changed, vectors)],
+            ['embedding', 'description_hash'],
+        )
+        encoded += len(changed)
+        if on_changed is not None:
+            on_changed(np.array([book_id for book_id, _, _ in changed], dtype='int64'), vectors)
+
+    stale = Book.objects.exclude(has_description()).filter(description_hash__isnull=False)
+    cleared_ids = list(stale.values_list('id', flat=True))
+    if cleared_ids:
+        Book.objects.filter(id__in=cleared_ids).update(embedding=None, description_hash=None)
+
+    seen_ids = np.concatenate(seen) if seen else np.empty(0, dtype='int64')
+    return seen_ids, encoded, cleared_ids
+
+
+def stored_embeddings(ids):
+    """(ids, vectors) of the books among `ids` that have a stored embedding."""
+    import numpy as np
+
+    rows = []
+    for chunk in id_chunks(np.asarray(ids, dtype='int64').tolist()):
+        rows.extend(Book.objects.filter(id__in=chunk, embedding__isnull=False).values_list('id', 'embedding'))
+    if not rows:
+        return np.empty(0, dtype='int64'), None
+    return (np.array([row[0] for row in rows], dtype='int64'),
+            np.stack([unpack_embedding(row[1])[1] for row in rows]))
+
+
+def iter_stored_embeddings(chunk_size=1000):
+    """
+    Yields (ids, vectors) chunks of the embeddings stored on the books table.
+    Each row is decoded with np.frombuffer; the only copy is stacking the
+    chunk into the contiguous float32 matrix FAISS needs.
+    """
+    import numpy as np
+
+    queryset = Book.objects.filter(has_description(), embedding__isnull=False)
+    for rows in iter_chunks(queryset, ('id', 'embedding'), chunk_size):
+        ids = np.array([row[0] for row in rows], dtype='int64')
+        vectors = np.stack([unpack_embedding(row[1])[1] for row in rows])
+        yield ids, vectors
+
+
+def _stored_sample(n, sample_size, chunk_size):
+    """Every (n // sample_size)-th stored embedding, read chunk by chunk."""
+    import numpy as np
+
+    step = max(1, n // sample_size)
+    position, parts = 0, []
+    for _, vectors in iter_stored_embeddings(chunk_size):
+        parts.append(vectors[(-position) % step::step])
+        position += len(vectors)
+    return np.concatenate(parts)
+
+
+def build_index_from_db(chunk_size=1000, index_type='flat', nlist=None, pq_m=16, hnsw_m=32, train_sample=None):
+    """
+    Builds a fresh index from the stored embeddings without running the
+    model. Vectors are streamed in chunks; trained index types first take an
+    evenly spaced sample for training in a separate pass. Returns None if
+    no book has a stored embedding.
+    """
+    import numpy as np
+
+    n = Book.objects.filter(has_description(), embedding__isnull=False).count()
+    if not n:
+        return None
+
+    index = None
+    for ids, vectors in iter_stored_embeddings(chunk_size):
+        if index is None:
+            index = create_index(vectors.shape[1], n, index_type, nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m)
+            if not index.is_trained:
+                index.train(_stored_sample(n, training_sample_size(index, n, train_sample), chunk_size))
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+# What check_consistency reports, as {problem: description of the books}.
+CONSISTENCY_CHECKS = {
+    'missing_embedding': 'have a description but no stored embedding',
+    'unreadable_embedding': 'have a stored embedding that cannot be decoded',
+    'stale_embedding': 'have a stored embedding that does not match their current description',
+    'missing_from_index': 'have a stored embedding but no vector in the index',
+    'vector_mismatch': 'have an index vector that differs from the stored embedding',
+    'orphaned': 'are in the index but were deleted or have no description',
+}
+
+# Largest allowed |index - stored| difference, relative to the largest
+# component of the stored vector. The index may hold the full-precision
+# model output while the database keeps a float16/int8 copy.
+STORAGE_TOLERANCE = {'float32': 1e-6, 'float16': 1e-3, 'int8': 1 / 200}
+
+
+def reconstruct_vectors(index, ids):
+    """
+    Returns the vectors stored in `index` for `ids` (all of which must be in
+    the index), or None for IVF-PQ, which only keeps lossy codes. IVF
+    indexes get a hash-table direct map attached to look vectors up by ID.
+    """
+    import numpy as np
+    import faiss
+
+    ids = np.asarray(ids, dtype='int64')
+    if isinstance(index, faiss.IndexIDMap):
+        id_map = faiss.vector_to_array(index.id_map)
+        order = np.argsort(id_map)
+        positions = order[np.searchsorted(id_map, ids, sorter=order)]
+        return faiss.downcast_index(index.index).reconstruct_batch(positions)
+    if index_type_of(index) == 'ivfpq':
+        return None
+    ivf = faiss.extract_index_ivf(index)
+    if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index.reconstruct_batch(ids)
+
+
+def check_consistency(index, chunk_size=1000):
+    """
+    Cross-checks every book with a description against its stored embedding,
+    its description hash and `index`, without running the model. Returns
+    ({problem: [book ids]} keyed like CONSISTENCY_CHECKS, number of vectors
+    compared). Vectors are not compared for IVF-PQ indexes.
+    """
+    import numpy as np
+
+    indexed = index_ids(index)
+    in_index = set(indexed.tolist())
+    problems = {problem: [] for problem in CONSISTENCY_CHECKS}
+    seen, compared = set(), 0
+
+    fields = ('id', 'description', 'description_hash', 'embedding')
+    for rows in iter_chunks(Book.objects.filter(has_description()), fields, chunk_size):
+        to_compare = []
+        for book_id, text, stored_hash, data in rows:
+            seen.add(book_id)
+            if data is None:
+                problems['missing_embedding'].append(book_id)
+                continue
+            try:
+                _, vector = unpack_embedding(data)
+                tolerance = STORAGE_TOLERANCE[embedding_dtype(data)]
+            except (ValueError, KeyError, struct.error):
+                problems['unreadable_embedding'].append(book_id)
+                continue
+            if stored_hash != description_hash(text):
+                problems['stale_embedding'].append(book_id)
+            if book_id not in in_index:
+                problems['missing_from_index'].append(book_id)
+            else:
+                to_compare.append((book_id, vector, tolerance))
+
+        if not to_compare:
+            continue
+        indexed_vectors = reconstruct_vectors(index, [book_id for book_id, _, _ in to_compare])
+        if indexed_vectors is None:
+            continue
+        for (book_id, vector, tolerance), indexed_vector in zip(to_compare, indexed_vectors):
+            scale = float(np.abs(vector).max()) or 1.0
+            if vector.shape != indexed_vector.shape or np.abs(indexed_vector - vector).max() > tolerance * scale:
+                problems['vector_mismatch'].append(book_id)
+        compared += len(to_compare)
+
+    problems['orphaned'] = sorted(in_index - seen)
+    return problems, compared
+
+
+@contextmanager
+def index_write_lock(path=INDEX_FILE_PATH):
+    """
+    Exclusive lock for read-modify-write of the index at `path`, an flock on
+    a `.lock` file next to it (the index file itself is replaced on every
+    write, so it can't carry the lock). Blocks until other writers are done;
+    readers never take it. Not reentrant: don't nest it for the same path.
+    """
+    import fcntl
+
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield  # closing the file releases the lock
+
+
+def load_or_create_index(dimension, path=INDEX_FILE_PATH):
+    import faiss
+
+    if os.path.exists(path):
+        return faiss.read_index(path)
+    logger.warning(f"FAISS index file not found at {path}. Starting a new one.")
+    return faiss.IndexIDMap(faiss.IndexFlatL2(dimension))
+
+
+def process_pending(model, batch_size=256, path=INDEX_FILE_PATH, on_indexed=None):
+    """
+    Drains up to `batch_size` queued books: encodes all of their descriptions
+    in one call, applies the changes to the index in one pass and publishes
+    the new index atomically. `on_indexed(index, book_ids)` is then called
+    with the published index and the books that were handled. Returns the
+    number of queue entries handled.
+    """
+    import numpy as np
+
+    jobs = list(PendingEmbedding.objects.order_by('queued_at')[:batch_size])
+    if not jobs:
+        return 0
+
+    book_ids = [job.book_id for job in jobs]
+    books = {
+        book['id']: book['description']
+        for book in Book.objects.filter(id__in=book_ids).values('id', 'description')
+    }
+    to_encode = [book_id for book_id in book_ids if books.get(book_id)]
+    cleared = [book_id for book_id in book_ids if book_id in books and not books[book_id]]
+    if cleared:
+        Book.objects.filter(id__in=cleared).update(embedding=None, description_hash=None)
+
+    embeddings = None
+    if to_encode:
+        embeddings = np.asarray(model.encode([books[book_id] for book_id in to_encode]), dtype='float32')
+        Book.objects.bulk_update(
+            [Book(id=book_id, embedding=_pack(emb), description_hash=description_hash(books[book_id]))
+             for book_id, emb in zip(to_encode, embeddings)],
+            ['embedding', 'description_hash'],
+        )
+
+    # Deleted books and books whose description was cleared drop out of the
+    # index; everything else is replaced with its new vector.
+    with index_write_lock(path):
+        index = load_or_create_index(model.get_sentence_embedding_dimension(), path)
+        add_ids = to_encode
+        try:
+            index.remove_ids(np.array(book_ids, dtype='int64'))
+        except RuntimeError:
+            # HNSW graphs can't drop vectors. Only add books that aren't in the
+            # index yet; edits/deletes are picked up by the next full rebuild.
+            present = set(index_ids(index).tolist())
+            logger.warning(f"Index type does not support removal; {len(present & set(book_ids))} "
+                           f"book(s) keep their old vector until generate_embeddings is rerun.")
+            if embeddings is not None:
+                new_rows = [row for row, book_id in enumerate(to_encode) if book_id not in present]
+                embeddings = embeddings[new_rows] if new_rows else None
+                add_ids = [to_encode[row] for row in new_rows]
+        if embeddings is not None:
+            index.add_with_ids(embeddings, np.array(add_ids, dtype='int64'))
+        write_index_atomic(index, path)
+
+    # Only clear the entries we actually processed. A book edited again while
+    # we were encoding has a newer timestamp and stays queued.
+    processed = Q()
+    for job in jobs:
+        processed |= Q(pk=job.pk, queued_at=job.queued_at)
+    PendingEmbedding.objects.filter(processed).delete()
+
+    logger.info(f"Indexed {len(to_encode)} book(s), removed {len(book_ids) - len(to_encode)} from the index.")
+    if on_indexed is not None:
+        try:
+            on_indexed(index, book_ids)
+        except Exception as e:
+            # Derived data only (e.g. similar-book lists); the index itself is published.
+            logger.error(f"Post-indexing update for {len(book_ids)} book(s) failed: {e}")
+    return len(jobs)
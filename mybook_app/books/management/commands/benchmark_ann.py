@@ -0,0 +1,78 @@
+# books/management/commands/benchmark_ann.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from books.indexing import INDEX_TYPES, build_index
+
+
+def synthetic_catalog(n, d, clusters=256, seed=0):
+    """
+    Clustered unit vectors, closer to real sentence embeddings than uniform
+    noise (which is a worst case for every ANN method).
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, d)).astype('float32')
+    x = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, d)).astype('float32')
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+class Command(BaseCommand):
+    help = 'Reports recall@k vs. the flat index, query latency, build time and size for each ANN index type.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--types', nargs='+', choices=list(INDEX_TYPES), default=list(INDEX_TYPES))
+        parser.add_argument('--dim', type=int, default=384)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--nprobe', type=int, default=16)
+        parser.add_argument('--ef-search', type=int, default=64)
+
+    def handle(self, *args, **options):
+        import numpy as np
+        import faiss
+
+        k = options['k']
+        params = faiss.ParameterSpace()
+        search_params = {'nprobe': options['nprobe'], 'efSearch': options['ef_search']}
+        self.stdout.write(f"{'books':>9} {'type':>6} {'build s':>9} {'size MiB':>9} "
+                          f"{f'recall@{k}':>10} {'mean ms':>8} {'p99 ms':>8}")
+
+        for n in options['sizes']:
+            data = synthetic_catalog(n + options['queries'], options['dim'])
+            catalog, queries = data[:n], data[n:]
+            ids = np.arange(n, dtype='int64')
+            truth = None
+
+            # 'flat' always runs first: it is the ground truth for recall.
+            for index_type in ['flat'] + [t for t in options['types'] if t != 'flat']:
+                started = time.perf_counter()
+                index = build_index(catalog, ids, index_type=index_type)
+                build_seconds = time.perf_counter() - started
+                for name, value in search_params.items():
+                    try:
+                        params.set_index_parameter(index, name, value)
+                    except RuntimeError:
+                        pass  # not applicable to this index type
+
+                # One query at a time, like the chat endpoint.
+                latencies, found = [], []
+                for q in queries:
+                    started = time.perf_counter()
+                    _, labels = index.search(q.reshape(1, -1), k)
+                    latencies.append(time.perf_counter() - started)
+                    found.append(labels[0])
+                found = np.array(found)
+                if truth is None:
+                    truth = found
+                recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+
+                size_mib = faiss.serialize_index(index).nbytes / 1024 / 1024
+                latencies_ms = np.array(latencies) * 1000
+                self.stdout.write(f'{n:>9} {index_type:>6} {build_seconds:>9.2f} {size_mib:>9.1f} '
+                                  f'{recall:>10.3f} {latencies_ms.mean():>8.3f} {np.percentile(latencies_ms, 99):>8.3f}')
+                del index
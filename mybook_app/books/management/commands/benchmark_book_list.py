@@ -0,0 +1,92 @@
+# books/management/commands/benchmark_book_list.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Measures payload size and query+serialization time of GET /api/books/ for the old '
+            '"__all__" representation, the lean list serializer and a ?fields= sparse fieldset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=50000,
+                            help='Catalogue size. Missing books are inserted inside a transaction that is rolled back.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per variant; the fastest one is reported.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.fill_catalog(options['books'])
+                self.run(options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def fill_catalog(self, n):
+        from books.embeddings import pack_embedding
+        from books.management.commands.benchmark_ann import synthetic_catalog
+        from books.models import Book, Category, Section
+
+        missing = n - Book.objects.count()
+        if missing <= 0:
+            return
+        self.stdout.write(f'Inserting {missing} synthetic books (rolled back afterwards)...')
+        vectors = synthetic_catalog(missing, 384)
+        section = Section.objects.get_or_create(name='General')[0]
+        category = Category.objects.get_or_create(name='Fiction')[0]
+        for start in range(0, missing, 2000):
+            Book.objects.bulk_create([
+                Book(title=f'Synthetic book {i}', author=f'Author {i % 997}', location=f'Shelf {i % 50}',
+                     section=section, category=category, description=' '.join(['A long description.'] * 30),
+                     embedding=pack_embedding(vectors[i]))
+                for i in range(start, min(start + 2000, missing))
+            ], batch_size=2000)
+
+    def run(self, repeat):
+        from books.models import Book
+        from books.views import BookViewSet
+
+        class FullBookSerializer(serializers.ModelSerializer):
+            # What BookSerializer used to be.
+            class Meta:
+                model = Book
+                fields = '__all__'
+
+        def old_representation():
+            data = FullBookSerializer(Book.objects.all(), many=True).data
+            return JSONRenderer().render(data)
+
+        factory = APIRequestFactory()
+        list_view = BookViewSet.as_view({'get': 'list'})
+
+        def endpoint(query=''):
+            def call():
+                response = list_view(factory.get(f'/api/books/{query}'))
+                return response.render().content
+            return call
+
+        variants = [
+            ('fields=__all__ (old)', old_representation),
+            ('list serializer', endpoint()),
+            ('?fields=id,title', endpoint('?fields=id,title')),
+        ]
+        self.stdout.write(f"{'variant':>22} {'books':>7} {'payload MiB':>12} {'bytes/book':>11} {'seconds':>8}")
+        for name, call in variants:
+            best, payload = None, b''
+            for _ in range(repeat):
+                started = time.perf_counter()
+                payload = call()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            n = Book.objects.count()
+            self.stdout.write(f'{name:>22} {n:>7} {len(payload) / 1024 / 1024:>12.1f} '
+                              f'{len(payload) / max(n, 1):>11.0f} {best:>8.2f}')
@@ -0,0 +1,89 @@
+# books/management/commands/benchmark_chat.py
+
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from books.chat_batcher import ChatBatcher
+from books.embeddings import MODEL_NAME, get_model
+from books.indexing import INDEX_FILE_PATH
+
+SAMPLE_QUERIES = [
+    'python books', 'data structures', 'machine learning for beginners',
+    'indian history', 'organic chemistry textbook', 'a good mystery novel',
+    'operating systems concepts', 'books about leadership', 'calculus',
+    'computer networks', 'poetry collections', 'database design',
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_clients(batcher, clients, requests_per_client, k):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        own = []
+        for i in range(requests_per_client):
+            query = SAMPLE_QUERIES[(offset + i) % len(SAMPLE_QUERIES)]
+            started = time.perf_counter()
+            batcher.search(query, k)
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, percentile(latencies, 50), percentile(latencies, 99)
+
+
+class Command(BaseCommand):
+    help = 'Measures chat encode+search throughput and latency with and without micro-batching.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 64])
+        parser.add_argument('--requests', type=int, default=50, help='Queries issued by each client.')
+        parser.add_argument('--k', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=settings.CHAT_BATCH_MAX_SIZE)
+        parser.add_argument('--window-ms', type=float, default=settings.CHAT_BATCH_WINDOW_MS)
+        parser.add_argument('--vectors', type=int, default=10000,
+                            help=f'Size of a synthetic index, used when {INDEX_FILE_PATH} does not exist.')
+
+    def handle(self, *args, **options):
+        import numpy as np
+        import faiss
+
+        model = get_model()
+        if model is None:
+            raise CommandError(f'Could not load model {MODEL_NAME}.')
+
+        if os.path.exists(INDEX_FILE_PATH):
+            index = faiss.read_index(INDEX_FILE_PATH)
+        else:
+            d = model.get_sentence_embedding_dimension()
+            index = faiss.IndexIDMap(faiss.IndexFlatL2(d))
+            index.add_with_ids(np.random.rand(options['vectors'], d).astype('float32'),
+                               np.arange(options['vectors'], dtype='int64'))
+        self.stdout.write(f'Index: {index.ntotal} vectors')
+
+        modes = [
+            ('unbatched', 1, 0.0),
+            ('batched', options['batch_size'], options['window_ms'] / 1000),
+        ]
+        self.stdout.write(f"{'clients':>8} {'mode':>10} {'q/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'avg batch':>10}")
+        for clients in options['clients']:
+            for mode, batch_size, window in modes:
+                batcher = ChatBatcher(lambda: model, lambda: index, max_batch_size=batch_size, max_wait=window)
+                qps, p50, p99 = run_clients(batcher, clients, options['requests'], options['k'])
+                avg_batch = batcher.stats()['avg_batch_size']
+                self.stdout.write(f'{clients:>8} {mode:>10} {qps:>9.1f} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f} {avg_batch:>10.1f}')
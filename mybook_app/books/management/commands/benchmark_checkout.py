@@ -0,0 +1,122 @@
+# books/management/commands/benchmark_checkout.py
+
+import datetime
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from books.circulation import DONE, checkout, return_book
+from books.models import Book, BookBorrow
+
+
+def contend(book_id, users, rounds, due_date):
+    """
+    Runs `rounds` rounds in which every user in `users` (one thread each)
+    tries to check out the same book at once; the round's winner then
+    returns it before the next round starts. Returns a dict of stats; a
+    correct run has exactly one winner per round and no errors.
+    """
+    barrier = threading.Barrier(len(users))
+    outcomes = [[None] * len(users) for _ in range(rounds)]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(slot, user):
+        try:
+            for round_outcomes in outcomes:
+                barrier.wait()
+                started = time.perf_counter()
+                try:
+                    outcome = checkout(book_id, user, due_date)[0]
+                except DatabaseError as e:
+                    outcome = 'error'
+                    with lock:
+                        errors.append(f'checkout: {e}')
+                elapsed = time.perf_counter() - started
+                round_outcomes[slot] = outcome
+                with lock:
+                    latencies.append(elapsed)
+                barrier.wait()  # every attempt of this round is over
+                if outcome == DONE:
+                    try:
+                        return_book(book_id, user)
+                    except DatabaseError as e:
+                        with lock:
+                            errors.append(f'return: {e}')
+        except threading.BrokenBarrierError:
+            pass
+        except BaseException:
+            barrier.abort()
+            raise
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(slot, user)) for slot, user in enumerate(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    winners = [sum(outcome == DONE for outcome in round_outcomes) for round_outcomes in outcomes]
+    latencies.sort()
+    return {
+        'seconds': seconds,
+        'attempts': len(latencies),
+        'checkouts': sum(winners),
+        'bad_rounds': sum(count != 1 for count in winners),
+        'errors': errors,
+        'mean_ms': sum(latencies) / max(len(latencies), 1) * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Stress-tests rent/return: many threads check out the same book at once, round after round. '
+            'Reports throughput and fails unless every round had exactly one winner.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[2, 8, 32])
+        parser.add_argument('--rounds', type=int, default=200)
+
+    def handle(self, *args, **options):
+        stamp = int(time.time())
+        User.objects.bulk_create([
+            User(username=f'checkout-bench-{stamp}-{i}') for i in range(max(options['threads']))
+        ])
+        users = list(User.objects.filter(username__startswith=f'checkout-bench-{stamp}-').order_by('id'))
+        # bulk_create: no post_save, so the synthetic book isn't queued for embedding.
+        Book.objects.bulk_create([Book(title=f'Checkout benchmark {stamp}')])
+        book = Book.objects.get(title=f'Checkout benchmark {stamp}')
+        due_date = datetime.date.today() + datetime.timedelta(days=14)
+        failed = False
+        try:
+            self.stdout.write(f"{'threads':>7} {'rounds':>6} {'attempts/s':>11} {'rentals/s':>10} "
+                              f"{'mean ms':>8} {'p99 ms':>8} {'bad rounds':>10} {'errors':>6}")
+            for n in options['threads']:
+                stats = contend(book.id, users[:n], options['rounds'], due_date)
+                self.stdout.write(
+                    f"{n:>7} {options['rounds']:>6} {stats['attempts'] / stats['seconds']:>11.0f} "
+                    f"{stats['checkouts'] / stats['seconds']:>10.0f} {stats['mean_ms']:>8.2f} "
+                    f"{stats['p99_ms']:>8.2f} {stats['bad_rounds']:>10} {len(stats['errors']):>6}")
+                for error in stats['errors'][:5]:
+                    self.stderr.write(f'  {error}')
+                failed = failed or stats['bad_rounds'] or stats['errors']
+
+            book.refresh_from_db()
+            open_borrows = BookBorrow.objects.filter(book=book, status='BORROWED').count()
+            if not book.available or open_borrows:
+                failed = True
+                self.stderr.write(f'Final state wrong: available={book.available}, open borrows={open_borrows}')
+        finally:
+            BookBorrow.objects.filter(book=book).delete()
+            book.delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+        if failed:
+            raise CommandError('Checkout contention check failed.')
+        self.stdout.write(self.style.SUCCESS('Every round had exactly one winner.'))
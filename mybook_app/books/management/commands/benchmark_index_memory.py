@@ -0,0 +1,87 @@
+# books/management/commands/benchmark_index_memory.py
+
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+import faiss
+from django.core.management.base import BaseCommand, CommandError
+from books.index_manager import mmap_read_flags
+
+
+def _read_memory_kb():
+    """Returns (rss, pss) of the current process in kB (Linux only)."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+
+def _worker(path, io_flags, ready, done, results):
+    index = faiss.read_index(path, io_flags)
+    # Touch every vector once, like a real search does.
+    index.search(np.zeros((1, index.d), dtype='float32'), 3)
+    ready.wait()  # measure only once every worker has mapped the file
+    results.put(_read_memory_kb())
+    done.wait()
+
+
+def measure(path, workers, io_flags):
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Barrier(workers + 1)
+    done = ctx.Event()
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, io_flags, ready, done, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    ready.wait()
+    samples = [results.get() for _ in procs]
+    done.set()
+    for p in procs:
+        p.join()
+    return sum(rss for rss, _ in samples), sum(pss for _, pss in samples)
+
+
+class Command(BaseCommand):
+    help = 'Compares total memory of N processes loading the FAISS index privately vs. via a shared mmap.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--vectors', type=int, default=100000,
+                            help='Size of the synthetic index, ignored when --path is given.')
+        parser.add_argument('--dim', type=int, default=384)
+        parser.add_argument('--path', help='Benchmark an existing index file instead of a synthetic one.')
+
+    def handle(self, *args, **options):
+        # Imported here: spawned workers import this module without Django set up.
+        from books.indexing import write_index_atomic
+
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            raise CommandError('This benchmark needs /proc/self/smaps_rollup (Linux).')
+
+        path = options['path']
+        tmpdir = None
+        if not path:
+            tmpdir = tempfile.TemporaryDirectory()
+            path = os.path.join(tmpdir.name, 'bench_index.faiss')
+            n, d = options['vectors'], options['dim']
+            self.stdout.write(f'Building synthetic index: {n} x {d} float32...')
+            index = faiss.IndexIDMap(faiss.IndexFlatL2(d))
+            index.add_with_ids(np.random.rand(n, d).astype('float32'), np.arange(n, dtype='int64'))
+            write_index_atomic(index, path)
+            del index
+        os.sync()  # freshly written pages are dirty and would skew the numbers
+
+        self.stdout.write(f'Index file: {os.path.getsize(path) / 1024 / 1024:.1f} MiB')
+        self.stdout.write(f"{'workers':>8} {'mode':>8} {'total RSS MiB':>14} {'total PSS MiB':>14}")
+        for workers in options['workers']:
+            for mode, flags in (('private', 0), ('mmap', mmap_read_flags())):
+                rss, pss = measure(path, workers, flags)
+                self.stdout.write(f'{workers:>8} {mode:>8} {rss / 1024:>14.1f} {pss / 1024:>14.1f}')
+
+        if tmpdir is not None:
+            tmpdir.cleanup()
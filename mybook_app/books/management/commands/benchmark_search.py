@@ -0,0 +1,89 @@
+# books/management/commands/benchmark_search.py
+
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Q
+from books.models import Book
+from books.search import search_books
+
+PAGE_SIZE = 24
+
+
+def synthetic_words(count, seed=0):
+    rng = random.Random(seed)
+    syllables = ['ba', 'ko', 'ri', 'tan', 'mel', 'sor', 'vi', 'den', 'lu', 'gra', 'pho', 'nex', 'ta', 'qui']
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = ("Compares ?search= latency of the full-text index with the old icontains (LIKE '%x%') filter. "
+            'Missing books are inserted (committed, so MySQL indexes them) and deleted again afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=50, help='Queries per kind (common word, rare word, prefix).')
+
+    def handle(self, *args, **options):
+        words = synthetic_words(5000)
+        last_id = self.fill_catalog(options['books'], words)
+        try:
+            self.run(words, options['queries'])
+        finally:
+            if last_id is not None:
+                # Raw DELETE: the synthetic rows have no relations, and
+                # going through the ORM would queue a re-embedding per book.
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DELETE FROM {Book._meta.db_table} WHERE id > %s', [last_id])
+
+    def fill_catalog(self, n, words):
+        missing = n - Book.objects.count()
+        if missing <= 0:
+            return None
+        self.stdout.write(f'Inserting {missing} synthetic books (deleted afterwards)...')
+        last_id = Book.objects.aggregate(last=Max('id'))['last'] or 0
+        # Zipf-like word frequencies, so some queries hit thousands of books and some a handful.
+        rng = random.Random(1)
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+        for start in range(0, missing, 5000):
+            Book.objects.bulk_create([
+                Book(title=' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 6))).title(),
+                     author=' '.join(rng.choices(words, k=2)).title())
+                for _ in range(start, min(start + 5000, missing))
+            ])
+        return last_id
+
+    def run(self, words, count):
+        rng = random.Random(2)
+        kinds = {
+            'common word': words[:20],
+            'rare word': words[-500:],
+            'prefix (4 chars)': [word[:4] for word in words[:500]],
+            'two words': [f'{a} {b}' for a, b in zip(words[:50], words[50:100])],
+        }
+        paths = {
+            'icontains': lambda q: Book.objects.filter(Q(title__icontains=q) | Q(author__icontains=q)).order_by('id'),
+            'fulltext': lambda q: search_books(Book.objects.all(), q).order_by('-relevance', 'id'),
+        }
+
+        self.stdout.write(f'{Book.objects.count()} books, backend: {connection.vendor}, first page of {PAGE_SIZE}')
+        self.stdout.write(f"{'query kind':>18} {'path':>10} {'mean ms':>9} {'p95 ms':>9} {'avg hits':>9}")
+        for kind, pool in kinds.items():
+            queries = [rng.choice(pool) for _ in range(count)]
+            for path, build in paths.items():
+                timings, hits = [], 0
+                for q in queries:
+                    started = time.perf_counter()
+                    page = list(build(q).values_list('id', flat=True)[:PAGE_SIZE])
+                    timings.append(time.perf_counter() - started)
+                    hits += len(page)
+                timings.sort()
+                mean = sum(timings) / len(timings) * 1000
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000
+                self.stdout.write(f'{kind:>18} {path:>10} {mean:>9.2f} {p95:>9.2f} {hits / len(queries):>9.1f}')
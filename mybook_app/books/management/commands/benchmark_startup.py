@@ -0,0 +1,57 @@
+# books/management/commands/benchmark_startup.py
+
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Modules that must only be imported by the chat/indexing code paths.
+HEAVY_MODULES = ('torch', 'sentence_transformers', 'transformers', 'faiss', 'numpy')
+
+
+def profile_startup(command_args):
+    """
+    Runs `python -X importtime manage.py <command_args>` in a fresh process.
+    Returns (wall_seconds, {top-level module: cumulative import microseconds}).
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'manage.py', *command_args],
+        cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if cumulative.strip().isdigit() and '.' not in name:
+            imports[name] = imports.get(name, 0) + int(cumulative)
+    return wall, imports
+
+
+class Command(BaseCommand):
+    help = 'Measures process startup/import time of a management command (default: check).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', nargs='*', default=['check'],
+                            help='Command (and arguments) to profile.')
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **options):
+        wall, imports = profile_startup(options['target'])
+        self.stdout.write(f"manage.py {' '.join(options['target'])}: {wall:.2f}s wall")
+        self.stdout.write(f"{'module':<30} {'cumulative ms':>14}")
+        for name, micros in sorted(imports.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{name:<30} {micros / 1000:>14.1f}')
+
+        loaded = [name for name in HEAVY_MODULES if name in imports]
+        if loaded:
+            self.stdout.write(self.style.WARNING(f"AI stack imported at startup: {', '.join(loaded)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('AI stack not imported at startup.'))
@@ -0,0 +1,53 @@
+# books/management/commands/benchmark_suggest.py
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from books.management.commands.benchmark_search import synthetic_words
+from books.suggest_index import _Data, deep_sizeof
+
+
+def misspell(word, rng):
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice('aeioutnrs') + word[i + 1:]
+
+
+class Command(BaseCommand):
+    help = 'Measures /api/books/suggest/ index build time, memory and query latency on a synthetic catalogue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, nargs='+', default=[10000, 50000, 100000])
+        parser.add_argument('--queries', type=int, default=500, help='Queries per kind.')
+        parser.add_argument('--limit', type=int, default=8)
+
+    def handle(self, *args, **options):
+        words = synthetic_words(5000)
+        self.stdout.write(f"{'books':>7} {'build s':>8} {'MiB':>6} {'query kind':>18} {'mean ms':>8} {'p99 ms':>8}")
+        for n in options['books']:
+            rng = random.Random(0)
+            data = _Data()
+            started = time.perf_counter()
+            for book_id in range(n):
+                data.add(book_id, ' '.join(rng.choices(words, k=rng.randint(2, 6))).title(),
+                         ' '.join(rng.choices(words, k=2)).title())
+            build_seconds = time.perf_counter() - started
+            mib = deep_sizeof(data.__dict__) / 1024 / 1024
+
+            kinds = {
+                'prefix (2 chars)': lambda: rng.choice(words)[:2],
+                'prefix (5 chars)': lambda: rng.choice(words)[:5],
+                'typo': lambda: misspell(rng.choice(words), rng),
+                'two words + prefix': lambda: f'{rng.choice(words)} {rng.choice(words)[:3]}',
+            }
+            for kind, make_query in kinds.items():
+                timings = []
+                for _ in range(options['queries']):
+                    query = make_query()
+                    started = time.perf_counter()
+                    data.suggest(query, options['limit'])
+                    timings.append(time.perf_counter() - started)
+                timings.sort()
+                mean = sum(timings) / len(timings) * 1000
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+                self.stdout.write(f'{n:>7} {build_seconds:>8.2f} {mib:>6.1f} {kind:>18} {mean:>8.2f} {p99:>8.2f}')
@@ -0,0 +1,91 @@
+# books/management/commands/check_query_plans.py
+
+import json
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from books.models import Book, BookBorrow, BookRequest, RecommendedBook, SimilarBook, StudentQuery
+from books.pagination import AdminListPagination, BookCursorPagination
+
+_SQLITE_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)')
+
+
+def hot_queries():
+    """
+    (name, queryset) of the most frequent filtered queries, built the way
+    the views/serializers build them (admin lists as their first page).
+    """
+    today = timezone.now().date()
+    page = AdminListPagination.page_size
+    user_id = User.objects.order_by('id').values_list('id', flat=True).first() or 1
+    book_id = Book.objects.order_by('id').values_list('id', flat=True).first() or 1
+    return [
+        ('admin: overdue books', BookBorrow.objects.filter(due_date__lt=today, status='BORROWED')
+         .select_related('book', 'user').order_by('id')[:page]),
+        ('admin: raised queries', StudentQuery.objects.filter(status='PENDING')
+         .select_related('user').order_by('id')[:page]),
+        ('admin: pending requests', BookRequest.objects.filter(status='PENDING')
+         .select_related('book', 'user').order_by('-id')[:page]),
+        ('profile: borrowed books', BookBorrow.objects.filter(user_id=user_id).select_related('book')),
+        ('profile: requested books', BookRequest.objects.filter(user_id=user_id)
+         .order_by('-request_date').select_related('book')),
+        ('profile: recommendations', RecommendedBook.objects.filter(user_id=user_id)
+         .select_related('book').order_by('rank')),
+        ('return: open borrow', BookBorrow.objects.filter(book_id=book_id, status='BORROWED')),
+        ('raise_request: duplicate check', BookRequest.objects.filter(book_id=book_id, user_id=user_id,
+                                                                       status='PENDING')),
+        ('similar books', SimilarBook.objects.filter(book_id=book_id).select_related('similar').order_by('rank')),
+        ('catalogue: by category', Book.objects.filter(category__name='Fiction')
+         .select_related('category', 'section').order_by('id')[:BookCursorPagination.page_size]),
+        ('catalogue: by section', Book.objects.filter(section__name='Section-A')
+         .select_related('category', 'section').order_by('id')[:BookCursorPagination.page_size]),
+    ]
+
+
+def _mysql_scans(node):
+    if isinstance(node, dict):
+        # 'ALL' reads the whole table, 'index' the whole of an index.
+        if node.get('access_type') in ('ALL', 'index'):
+            yield node.get('table_name', '?')
+        for value in node.values():
+            yield from _mysql_scans(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _mysql_scans(value)
+
+
+def full_scans(queryset):
+    """Returns (tables read in full according to EXPLAIN, the plan as text)."""
+    if connection.vendor == 'sqlite':
+        plan = queryset.explain()
+        return _SQLITE_SCAN.findall(plan), plan
+    if connection.vendor == 'mysql':
+        plan = queryset.explain(format='json')
+        return list(_mysql_scans(json.loads(plan))), plan
+    raise CommandError(f'Reading query plans is not implemented for {connection.vendor}.')
+
+
+class Command(BaseCommand):
+    help = ('Runs EXPLAIN on the hot filtered queries (admin lists, profile, circulation) and fails '
+            'if any of them reads a whole table. MySQL may prefer a full scan on tiny tables, so run '
+            'it against a realistically sized database.')
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, queryset in hot_queries():
+            tables, plan = full_scans(queryset)
+            if tables:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}: {', '.join(tables)}"))
+            else:
+                self.stdout.write(f'ok         {name}')
+            if tables or options['verbosity'] > 1:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+        if failures:
+            raise CommandError(f"{len(failures)} hot quer{'y' if len(failures) == 1 else 'ies'} "
+                               f"fell back to a full scan: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('Every hot query uses an index.'))
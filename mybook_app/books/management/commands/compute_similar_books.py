@@ -0,0 +1,36 @@
+# books/management/commands/compute_similar_books.py
+
+import os
+import time
+import faiss
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from books.indexing import INDEX_FILE_PATH
+from books.similar import compute_all
+
+
+class Command(BaseCommand):
+    help = ('Precomputes the nearest neighbours of every book in the FAISS index for /api/books/{id}/similar/. '
+            'The index worker keeps the lists up to date afterwards; rerun this after large changes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=settings.SIMILAR_BOOKS_COUNT,
+                            help='Neighbours stored per book.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Books searched and written per batch.')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(INDEX_FILE_PATH):
+            raise CommandError(f'No FAISS index at {INDEX_FILE_PATH}. Run generate_embeddings first.')
+        if options['count'] < 1:
+            raise CommandError('--count must be at least 1.')
+
+        # A private, writable copy: IVF indexes get a direct map attached to
+        # read their vectors back.
+        index = faiss.read_index(INDEX_FILE_PATH)
+
+        started = time.perf_counter()
+        books = compute_all(index, count=options['count'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {options['count']} similar books for each of {books} books "
+            f'in {time.perf_counter() - started:.1f}s.'
+        ))
@@ -1,83 +1,147 @@
 # books/management/commands/generate_embeddings.py
 
+import os
 import numpy as np
 import faiss
-from django.core.management.base import BaseCommand
-from books.models import Book
-from sentence_transformers import SentenceTransformer
+from django.core.management.base import BaseCommand, CommandError
+from books.embeddings import MODEL_NAME, get_model
+from books.indexing import (
+    INDEX_FILE_PATH,
+    INDEX_TYPES,
+    build_index_from_db,
+    index_ids,
+    index_type_of,
+    index_write_lock,
+    stored_embeddings,
+    sync_embeddings,
+    write_index_atomic,
+)
+from books.similar import refresh as refresh_similar_books
 
-# This is the name of the pre-trained AI model we'll use
-MODEL_NAME = 'all-MiniLM-L6-v2'
 
-# This will be the name of our saved "brain" file
-INDEX_FILE_PATH = 'book_index.faiss'
+def add_index_arguments(parser):
+    """Options that control how a new index is built (shared with rebuild_index)."""
+    parser.add_argument('--index-type', choices=list(INDEX_TYPES),
+                        help='Rebuild as this type. flat = exact brute force; ivf/ivfpq/hnsw = approximate, '
+                             'sub-linear search. Default: keep the existing index, or flat for a new one.')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='Books read from the database (and written back) per chunk.')
+    parser.add_argument('--nlist', type=int, help='IVF cells (default: about 4*sqrt(n)).')
+    parser.add_argument('--pq-m', type=int, default=16, help='IVF-PQ sub-quantizers (must divide the dimension).')
+    parser.add_argument('--hnsw-m', type=int, default=32, help='HNSW graph neighbours per node.')
+    parser.add_argument('--train-sample', type=int,
+                        help='Vectors used to train IVF indexes (default: 64 per cell).')
+
 
 class Command(BaseCommand):
-    help = 'Generates and saves embeddings for all books with a description.'
+    help = ('Generates embeddings for books whose description changed since the last run '
+            'and updates (or, with --rebuild/--index-type, rebuilds) the FAISS index.')
+
+    def add_arguments(self, parser):
+        add_index_arguments(parser)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Build a new index from all stored embeddings instead of patching the existing one.')
+        parser.add_argument('--batch-size', type=int, default=64, help='Model encode batch size.')
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.NOTICE('Starting embedding generation...'))
 
-        # 1. Fetch all books that have a description
-        # We only get the 'id' and 'description' to be efficient
-        books = list(Book.objects.filter(description__isnull=False).values('id', 'description'))
+        # 1. Load the AI model
+        self.stdout.write(f'Loading model: {MODEL_NAME}...')
+        model = get_model()
+        if model is None:
+            raise CommandError(f'Could not load model {MODEL_NAME}.')
 
-        if not books:
-            self.stdout.write(self.style.WARNING('No books with descriptions found. Exiting.'))
+        # 2-4 run under the index lock, so the index worker can't publish a
+        # change between our read of the file and our rename over it.
+        with index_write_lock(INDEX_FILE_PATH):
+            index, changed = self.update_index(model, options)
+        if index is None:
             return
 
-        self.stdout.write(f'Found {len(books)} books with descriptions.')
+        changed_ids = np.concatenate(changed)
+        if len(changed_ids):
+            refreshed = refresh_similar_books(index, changed_ids)
+            self.stdout.write(f'Refreshed {refreshed} similar-book list(s).')
+        self.stdout.write(self.style.SUCCESS('AI "Brain" generation complete!'))
 
-        # 2. Load the AI model
-        self.stdout.write(f'Loading model: {MODEL_NAME}...')
-        model = SentenceTransformer(MODEL_NAME)
-
-        # 3. Create the embeddings
-        # Get just the description texts to feed to the model
-        descriptions = [book['description'] for book in books]
-        
-        self.stdout.write('Model loaded. Generating embeddings... (This may take a moment)')
-        embeddings = model.encode(descriptions, show_progress_bar=True)
-        self.stdout.write(self.style.SUCCESS('Embeddings generated successfully!'))
-
-        # 4. Save the embeddings to the FAISS index file
-        
-        # Get the dimension of our vectors (e.g., 384)
-        d = embeddings.shape[1]
-        
-        # Create a FAISS index
-        index = faiss.IndexFlatL2(d)
-        
-        # FAISS needs a special map to link its internal IDs to our *actual* Book IDs
-        index_with_ids = faiss.IndexIDMap(index)
-        
-        # Get our book IDs as a numpy array, which FAISS requires
-        book_ids = np.array([book['id'] for book in books]).astype('int64')
-
-        # Add our vectors and their corresponding IDs to the index
-        index_with_ids.add_with_ids(embeddings, book_ids)
-
-        # Save the "brain" file
-        faiss.write_index(index_with_ids, INDEX_FILE_PATH)
-        self.stdout.write(self.style.SUCCESS(f'FAISS index saved to {INDEX_FILE_PATH}'))
-
-        # 5. Save embeddings to our MySQL database (as a backup)
-        self.stdout.write('Saving embeddings to the database as backups...')
-        
-        books_to_update = []
-        # We fetch the *full* book objects this time to update them
-        book_objects = Book.objects.filter(id__in=book_ids)
-        
-        # Create a dictionary of {book_id: embedding_list}
-        embedding_map = {book_id: emb.tolist() for book_id, emb in zip(book_ids, embeddings)}
-        
-        for book in book_objects:
-            if book.id in embedding_map:
-                book.embedding = embedding_map[book.id]
-                books_to_update.append(book)
-
-        # Use bulk_update to save them all in one efficient query
-        Book.objects.bulk_update(books_to_update, ['embedding'])
-        
-        self.stdout.write(self.style.SUCCESS('Database backups saved.'))
-        self.stdout.write(self.style.SUCCESS('AI "Brain" generation complete!'))
\ No newline at end of file
+    def update_index(self, model, options):
+        """
+        Syncs the stored embeddings and patches or rebuilds the index file.
+        Returns (published index or None, arrays of the book IDs whose
+        vectors changed).
+        """
+        # 2. Decide between patching the existing index and building a new one.
+        # An explicit --index-type or --rebuild always builds from scratch.
+        rebuild = options['rebuild'] or options['index_type'] is not None or not os.path.exists(INDEX_FILE_PATH)
+        index_type = options['index_type'] or 'flat'
+        index = None
+        if not rebuild:
+            index = faiss.read_index(INDEX_FILE_PATH)
+            index_type = index_type_of(index)
+            self.stdout.write(f'Updating existing index ({index.ntotal} vectors) in place.')
+
+        changed = []
+
+        def apply_changes(ids, vectors):
+            # Called once per chunk with only the books whose text changed.
+            nonlocal index, rebuild
+            changed.append(ids)
+            if index is None:
+                return
+            try:
+                index.remove_ids(ids)
+            except RuntimeError:
+                self.stdout.write(self.style.WARNING('Index type cannot remove vectors; falling back to a full rebuild.'))
+                index, rebuild = None, True
+                return
+            index.add_with_ids(vectors, ids)
+
+        # 3. Stream the books table in chunks and only encode changed descriptions.
+        # Embeddings and their description hashes are saved to the database chunk by chunk.
+        self.stdout.write('Checking descriptions and generating embeddings for changed books...')
+        seen_ids, encoded, cleared_ids = sync_embeddings(
+            model, chunk_size=options['chunk_size'], batch_size=options['batch_size'], on_changed=apply_changes,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(seen_ids)} books with descriptions, {encoded} (re)encoded, {len(cleared_ids)} cleared.'
+        ))
+
+        if not rebuild:
+            # Drop books that were deleted or lost their description.
+            stale = np.setdiff1d(index_ids(index), seen_ids)
+            if len(stale):
+                index.remove_ids(stale)
+                changed.append(stale)
+            # Re-add books that should be indexed but aren't (e.g. a worker
+            # run that stored their embedding but died before publishing).
+            missing_ids, missing_vectors = stored_embeddings(np.setdiff1d(seen_ids, index_ids(index)))
+            if len(missing_ids):
+                index.add_with_ids(missing_vectors, missing_ids)
+                changed.append(missing_ids)
+            if not encoded and not len(stale) and not len(missing_ids):
+                self.stdout.write(self.style.SUCCESS('FAISS index is already up to date.'))
+                return None, changed
+        else:
+            # 4. Build the index from the stored embeddings (labelled with Book IDs so
+            # FAISS returns our *actual* Book IDs). The layout is documented in
+            # books/indexing.py; the chat path reads FAISS_NPROBE / FAISS_EF_SEARCH
+            # from settings for the ANN types.
+            self.stdout.write(f"Building '{index_type}' index...")
+            index = build_index_from_db(
+                chunk_size=options['chunk_size'],
+                index_type=index_type,
+                nlist=options['nlist'],
+                pq_m=options['pq_m'],
+                hnsw_m=options['hnsw_m'],
+                train_sample=options['train_sample'],
+            )
+            if index is None:
+                self.stdout.write(self.style.WARNING('No books with descriptions found. Exiting.'))
+                return None, changed
+
+        # Save the "brain" file (temp file + rename, so readers never see a partial write)
+        write_index_atomic(index, INDEX_FILE_PATH)
+        self.stdout.write(self.style.SUCCESS(f'FAISS index saved to {INDEX_FILE_PATH} ({index.ntotal} vectors)'))
+        changed.append(np.array(cleared_ids, dtype='int64'))
+        return index, changed
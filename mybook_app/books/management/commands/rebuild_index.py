@@ -0,0 +1,101 @@
+# books/management/commands/rebuild_index.py
+
+import os
+import time
+import faiss
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from books.index_manager import mmap_read_flags
+from books.indexing import (
+    CONSISTENCY_CHECKS,
+    INDEX_FILE_PATH,
+    build_index_from_db,
+    check_consistency,
+    has_description,
+    index_type_of,
+    index_write_lock,
+    write_index_atomic,
+)
+from books.management.commands.generate_embeddings import add_index_arguments
+from books.models import Book
+
+# IDs printed per problem before the report is cut short.
+MAX_LISTED_IDS = 20
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the FAISS index. With --from-db the embeddings stored on the books table are '
+            'read back in chunks, so no model is loaded; otherwise this runs generate_embeddings --rebuild. '
+            '--check reports books whose stored embedding, description hash and index vector disagree.')
+
+    def add_arguments(self, parser):
+        add_index_arguments(parser)
+        parser.add_argument('--from-db', action='store_true',
+                            help='Build from the stored embeddings only, without running the model.')
+        parser.add_argument('--check', action='store_true',
+                            help='Check the index against the database (after rebuilding, if --from-db is given). '
+                                 'Exits with an error if anything is inconsistent.')
+
+    def handle(self, *args, **options):
+        build_options = {name: options[name] for name in
+                         ('index_type', 'chunk_size', 'nlist', 'pq_m', 'hnsw_m', 'train_sample')}
+
+        if options['from_db']:
+            self.rebuild_from_db(build_options)
+        elif not options['check']:
+            call_command('generate_embeddings', rebuild=True, stdout=self.stdout, stderr=self.stderr, **build_options)
+
+        if options['check']:
+            self.check(options['chunk_size'])
+
+    def rebuild_from_db(self, build_options):
+        # Locked so an index worker batch published while we build isn't
+        # overwritten; the worker waits and applies it to our index instead.
+        with index_write_lock(INDEX_FILE_PATH):
+            # Keep the current index type unless another one was asked for.
+            if build_options['index_type'] is None:
+                build_options['index_type'] = 'flat'
+                if os.path.exists(INDEX_FILE_PATH):
+                    build_options['index_type'] = index_type_of(faiss.read_index(INDEX_FILE_PATH, mmap_read_flags()))
+
+            self.stdout.write(f"Building '{build_options['index_type']}' index from stored embeddings...")
+            started = time.perf_counter()
+            index = build_index_from_db(**build_options)
+            if index is None:
+                raise CommandError('No book has a stored embedding. Run generate_embeddings first.')
+            write_index_atomic(index, INDEX_FILE_PATH)
+        self.stdout.write(self.style.SUCCESS(
+            f'FAISS index saved to {INDEX_FILE_PATH} ({index.ntotal} vectors, {time.perf_counter() - started:.1f}s)'
+        ))
+
+        unencoded = Book.objects.filter(has_description(), embedding__isnull=True).count()
+        if unencoded:
+            self.stdout.write(self.style.WARNING(
+                f'{unencoded} book(s) with a description have no stored embedding and are not in the index. '
+                f'Run generate_embeddings to encode them.'
+            ))
+
+    def check(self, chunk_size):
+        if not os.path.exists(INDEX_FILE_PATH):
+            raise CommandError(f'FAISS index file not found at {INDEX_FILE_PATH}.')
+        index = faiss.read_index(INDEX_FILE_PATH)
+        self.stdout.write(f"Checking '{index_type_of(index)}' index ({index.ntotal} vectors) against the database...")
+
+        problems, compared = check_consistency(index, chunk_size=chunk_size)
+        if not compared and index.ntotal:
+            self.stdout.write(self.style.WARNING('Index vectors were not compared (IVF-PQ only keeps lossy codes).'))
+
+        found = 0
+        for problem, description in CONSISTENCY_CHECKS.items():
+            ids = problems[problem]
+            if not ids:
+                continue
+            found += len(ids)
+            listed = ', '.join(str(book_id) for book_id in ids[:MAX_LISTED_IDS])
+            more = f' (+{len(ids) - MAX_LISTED_IDS} more)' if len(ids) > MAX_LISTED_IDS else ''
+            self.stdout.write(self.style.WARNING(f'{len(ids)} book(s) {description}: {listed}{more}'))
+
+        if found:
+            raise CommandError(f'{found} inconsistencies found. Run generate_embeddings to encode missing or stale '
+                               f'embeddings and rebuild_index --from-db to resync the index.')
+        self.stdout.write(self.style.SUCCESS(f'Index and database agree ({compared} vectors compared).'))
@@ -0,0 +1,39 @@
+# books/management/commands/run_index_worker.py
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from books.embeddings import MODEL_NAME, get_model
+from books.indexing import INDEX_FILE_PATH, process_pending
+from books.similar import refresh as refresh_similar_books
+
+
+class Command(BaseCommand):
+    help = 'Long-running worker that drains the PendingEmbedding queue into the FAISS index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=256,
+                            help='Maximum number of queued books handled per pass.')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit instead of polling forever.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Loading model: {MODEL_NAME}...')
+        model = get_model()
+        if model is None:
+            raise CommandError(f'Could not load model {MODEL_NAME}.')
+        self.stdout.write(self.style.SUCCESS(f'Index worker started, writing to {INDEX_FILE_PATH}.'))
+
+        # Run only one worker per index file: the worker is the single writer.
+        # The similar-book lists of every changed book are refreshed with it.
+        while True:
+            handled = process_pending(model, batch_size=options['batch_size'], on_indexed=refresh_similar_books)
+            if handled:
+                self.stdout.write(f'Processed {handled} queued book(s).')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('Queue drained.'))
@@ -0,0 +1,59 @@
+# books/management/commands/train_recommender.py
+
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from books.recommender import (
+    MODEL_FILE_PATH,
+    load_interactions,
+    load_model,
+    recommend,
+    save_model,
+    store,
+    train,
+    users_to_refresh,
+)
+
+
+class Command(BaseCommand):
+    help = ('Trains the borrow-history recommender (scikit-surprise SVD) and stores the top books per user '
+            'for /api/profile/recommendations/. Meant to run from cron: e.g. nightly, plus hourly with --refresh.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh', action='store_true',
+                            help='Reuse the saved model and only recompute users with new activity or no list yet.')
+        parser.add_argument('--count', type=int, default=settings.RECOMMENDATIONS_COUNT,
+                            help='Recommendations stored per user.')
+        parser.add_argument('--factors', type=int, default=50, help='SVD latent factors.')
+        parser.add_argument('--epochs', type=int, default=20, help='SVD training epochs.')
+        parser.add_argument('--negatives', type=int, default=1,
+                            help='Never-touched books sampled as negatives per interaction of each user.')
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError('--count must be at least 1.')
+
+        ratings = load_interactions()
+        algo = load_model(MODEL_FILE_PATH) if options['refresh'] else None
+        if algo is None:
+            if options['refresh']:
+                self.stdout.write(self.style.WARNING(f'No saved model at {MODEL_FILE_PATH}; training a new one.'))
+            if not ratings:
+                self.stdout.write(self.style.WARNING('No borrow or request history yet. Exiting.'))
+                return
+            started = time.perf_counter()
+            algo = train(ratings, factors=options['factors'], epochs=options['epochs'],
+                         negatives=options['negatives'])
+            save_model(algo, MODEL_FILE_PATH)
+            self.stdout.write(f'Trained on {len(ratings)} interactions in {time.perf_counter() - started:.1f}s, '
+                              f'saved to {MODEL_FILE_PATH}.')
+            user_ids = list(User.objects.filter(is_active=True).values_list('id', flat=True))
+        else:
+            user_ids = users_to_refresh()
+
+        started = time.perf_counter()
+        store(recommend(algo, user_ids, ratings, options['count']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored recommendations for {len(user_ids)} user(s) in {time.perf_counter() - started:.1f}s.'
+        ))
@@ -0,0 +1,55 @@
+# Generated by Django 4.2 on 2026-10-16 22:29
+#
+# Databases created before this migration existed may already have the
+# books_book.description column (it was added by hand), so the column is
+# only created when it is missing. The model state gets the field either way.
+
+from django.db import migrations, models
+
+
+def description_field(model):
+    # Built here: the historical Book these functions get has no field for it.
+    field = models.TextField(blank=True, null=True)
+    field.set_attributes_from_name('description')
+    field.model = model
+    return field
+
+
+def has_description_column(schema_editor, table):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        return 'description' in {column.name for column in connection.introspection.get_table_description(cursor, table)}
+
+
+def add_description_column(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    if not has_description_column(schema_editor, Book._meta.db_table):
+        schema_editor.add_field(Book, description_field(Book))
+
+
+def remove_description_column(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    if has_description_column(schema_editor, Book._meta.db_table):
+        schema_editor.remove_field(Book, description_field(Book))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_merge_20251023_2359'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='book',
+                    name='description',
+                    field=models.TextField(blank=True, null=True),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_description_column, remove_description_column),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-16 22:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_book_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.IntegerField(unique=True)),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
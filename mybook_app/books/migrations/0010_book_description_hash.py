@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-16 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_pendingembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='description_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
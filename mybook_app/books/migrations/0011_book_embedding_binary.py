@@ -0,0 +1,79 @@
+# Converts Book.embedding from a JSON float list to the packed binary
+# format described in books/embeddings.py (always float32 here; later
+# writes follow settings.EMBEDDING_STORAGE_DTYPE).
+
+import json
+import struct
+
+from django.db import migrations, models
+
+MAGIC = b'BEMB'
+HEADER = struct.Struct('<4sBHB')
+MODEL_NAME = b'all-MiniLM-L6-v2'
+BATCH_SIZE = 500
+
+
+def _pack_float32(values):
+    return b''.join([
+        HEADER.pack(MAGIC, 0, len(values), len(MODEL_NAME)),
+        MODEL_NAME,
+        struct.pack(f'<{len(values)}f', *values),
+    ])
+
+
+def _unpack_float32(data):
+    data = bytes(data)
+    magic, code, dim, name_len = HEADER.unpack_from(data)
+    if magic != MAGIC or code != 0:
+        return None  # only exact float32 rows can go back to JSON
+    return list(struct.unpack_from(f'<{dim}f', data, HEADER.size + name_len))
+
+
+def _convert(apps, source, target, convert):
+    Book = apps.get_model('books', 'Book')
+    batch = []
+    rows = Book.objects.filter(**{f'{source}__isnull': False}).only('id', source)
+    for book in rows.iterator(chunk_size=BATCH_SIZE):
+        value = getattr(book, source)
+        if isinstance(value, str):
+            value = json.loads(value)
+        setattr(book, target, convert(value))
+        batch.append(book)
+        if len(batch) >= BATCH_SIZE:
+            Book.objects.bulk_update(batch, [target])
+            batch = []
+    if batch:
+        Book.objects.bulk_update(batch, [target])
+
+
+def json_to_binary(apps, schema_editor):
+    _convert(apps, 'embedding', 'embedding_bin', _pack_float32)
+
+
+def binary_to_json(apps, schema_editor):
+    _convert(apps, 'embedding_bin', 'embedding', _unpack_float32)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_book_description_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='embedding_bin',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='book',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='book',
+            old_name='embedding_bin',
+            new_name='embedding',
+        ),
+    ]
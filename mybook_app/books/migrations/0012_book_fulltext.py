@@ -0,0 +1,84 @@
+# Full-text index on Book.title/author, used by books/search.py.
+# MySQL: a FULLTEXT index (InnoDB keeps it up to date itself).
+# SQLite: an external-content FTS5 table plus triggers that mirror every
+# INSERT/UPDATE/DELETE on books_book. Other backends get nothing and keep
+# using icontains.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'books_book_fts'
+FULLTEXT_INDEX = 'book_title_author_ft'
+
+SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, content='books_book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, author ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO {FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+    # Title hits weigh twice as much as author hits in the `rank` column.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(2.0, 1.0)')",
+    # Index the rows that already exist.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_fulltext(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        _run(schema_editor, [f'CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON books_book (title, author)'])
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_CREATE)
+
+
+def drop_fulltext(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        _run(schema_editor, [f'DROP INDEX {FULLTEXT_INDEX} ON books_book'])
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_book_embedding_binary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext, drop_fulltext),
+        migrations.CreateModel(
+            name='BookSearchIndex',
+            fields=[
+                ('book', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='books.book')),
+                ('title', models.TextField()),
+                ('author', models.TextField()),
+                ('query', models.TextField(db_column='books_book_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'books_book_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-16 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_recommendedbook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookborrow',
+            name='returned_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-16 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_bookborrow_returned_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookborrow',
+            index=models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookrequest',
+            index=models.Index(fields=['status', 'id'], name='request_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookrequest',
+            index=models.Index(fields=['user', 'request_date'], name='request_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentquery',
+            index=models.Index(fields=['status', 'id'], name='query_status_id_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Book.category_name / Book.section (free text) -> foreign keys to Category
+# and the new Section model. Every distinct non-blank string becomes (or is
+# matched case-insensitively to) a row; books are then pointed at it with one
+# UPDATE per distinct name. Category.name is widened to the 255 characters
+# of the old columns first, so no name has to be cut short (which could
+# merge distinct names).
+#
+# On SQLite, dropping a foreign key column (here when migrating backwards)
+# rebuilds books_book, which drops the full-text triggers from 0012; they
+# are recreated at the end in both directions.
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+fulltext = import_module('books.migrations.0012_book_fulltext')
+
+# (model, old text column, new foreign key)
+NAMED = [
+    ('Category', 'category_name', 'category'),
+    ('Section', 'section_name', 'section'),
+]
+
+
+def names_to_rows(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    for model_name, column, field in NAMED:
+        model = apps.get_model('books', model_name)
+        values = list(Book.objects.exclude(**{f'{column}__isnull': True})
+                      .values_list(column, flat=True).distinct())
+        for value in values:
+            name = value.strip()
+            if not name:
+                continue
+            row = model.objects.filter(name__iexact=name).first() or model.objects.create(name=name)
+            Book.objects.filter(**{column: value}).update(**{field: row})
+
+
+def rows_to_names(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    for model_name, column, field in NAMED:
+        for row in apps.get_model('books', model_name).objects.all():
+            Book.objects.filter(**{field: row}).update(**{column: row.name})
+
+
+def restore_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        fulltext._run(schema_editor, fulltext.SQLITE_CREATE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0016_status_date_indexes'),
+    ]
+
+    operations = [
+        # Runs last when migrating backwards.
+        migrations.RunPython(migrations.RunPython.noop, restore_fulltext),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.CreateModel(
+            name='Section',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.RenameField(
+            model_name='book',
+            old_name='section',
+            new_name='section_name',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='books', to='books.category'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='section',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='books', to='books.section'),
+        ),
+        migrations.RunPython(names_to_rows, rows_to_names),
+        migrations.RemoveField(
+            model_name='book',
+            name='category_name',
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='section_name',
+        ),
+        migrations.RunPython(restore_fulltext, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# FTS5 prefix indexes for 2-4 letter prefixes, so a prefix query ("pyth")
+# reads one index entry instead of merging the doclists of every word that
+# starts with it. SQLite only: the table is recreated and refilled.
+# MySQL's FULLTEXT index has no such option and is left alone.
+
+from importlib import import_module
+
+from django.db import migrations
+
+fulltext = import_module('books.migrations.0012_book_fulltext')
+
+SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fulltext.FTS_TABLE} USING fts5(
+        title, author, content='books_book', content_rowid='id',
+        prefix='2 3 4', tokenize='unicode61 remove_diacritics 2')""",
+    # Triggers, bm25 weights and the initial fill are as in 0012.
+    *fulltext.SQLITE_CREATE[1:],
+]
+
+
+def add_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        fulltext._run(schema_editor, fulltext.SQLITE_DROP + SQLITE_CREATE)
+
+
+def remove_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        fulltext._run(schema_editor, fulltext.SQLITE_DROP + fulltext.SQLITE_CREATE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0017_book_category_section_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_prefix_indexes, remove_prefix_indexes),
+    ]
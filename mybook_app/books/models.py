@@ -3,34 +3,176 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 import datetime
-from django.db.models import JSONField
 
 class Category(models.Model):
-    name = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=255, unique=True)
     class Meta:
         verbose_name_plural = "Categories"
     def __str__(self):
         return self.name
 
+class Section(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    def __str__(self):
+        return self.name
+
 class Book(models.Model):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=255)
     author = models.CharField(max_length=255, blank=True, null=True)
     location = models.CharField(max_length=255, blank=True, null=True)
-    section = models.CharField(max_length=255, blank=True, null=True)
-    category_name = models.CharField(max_length=255, blank=True, null=True)
+    # Filtered with `=` on the indexed FK column (see BookViewSet); the API
+    # exposes them by name as `section` and `category_name`.
+    section = models.ForeignKey(Section, on_delete=models.SET_NULL, null=True, blank=True, related_name='books')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='books')
 
     # Your existing description column (it's good that it's already here!)
     description = models.TextField(blank=True, null=True) 
     
     available = models.BooleanField(default=True)
     
-    # This is the new line you must add:
-    embedding = JSONField(null=True, blank=True) 
+    # Packed vector (see books/embeddings.py for the format) instead of a
+    # JSON float list: ~1.5 KB as float32 vs ~8 KB of JSON text per row.
+    embedding = models.BinaryField(null=True, blank=True)
+    # sha256 of model name + description the embedding was computed from,
+    # so generate_embeddings can skip books whose text hasn't changed.
+    description_hash = models.CharField(max_length=64, blank=True, null=True)
+
+    # Fields whose changes are tracked between loads/saves. The embedding
+    # signal only needs to know when the description text itself changed,
+    # the typeahead index when the title or author did.
+    TRACKED_FIELDS = ('description', 'title', 'author')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None):
+        # Deferred fields are left out so we never trigger an extra query here.
+        deferred = self.get_deferred_fields()
+        values = {
+            name: getattr(self, name)
+            for name in self.TRACKED_FIELDS
+            if name not in deferred and (fields is None or name in fields)
+        }
+        if fields is None or not hasattr(self, '_loaded_values'):
+            self._loaded_values = values
+        else:
+            self._loaded_values.update(values)
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Also how a deferred field is loaded on first access.
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_tracked_fields(fields)
+
+    def get_dirty_fields(self):
+        """
+        Returns the names of tracked fields that differ from the values
+        last loaded from (or saved to) the database. A field that was
+        deferred and has since been assigned counts as dirty, since its
+        old value is unknown. Unsaved instances report every tracked
+        field as dirty.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if self._state.adding or loaded is None:
+            return set(self.TRACKED_FIELDS)
+        deferred = self.get_deferred_fields()
+        return {
+            name for name in self.TRACKED_FIELDS
+            if name not in deferred and (name not in loaded or getattr(self, name) != loaded[name])
+        }
+
+    def has_changed(self, field_name):
+        return field_name in self.get_dirty_fields()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save handlers have already seen the dirty state by now.
+        self._snapshot_tracked_fields()
 
     def __str__(self):
         return self.title
 
+class PendingEmbedding(models.Model):
+    """
+    Durable queue of books whose embedding needs to be (re)computed.
+    One row per book, so repeated edits coalesce into a single job that the
+    `run_index_worker` command picks up.
+    """
+    book_id = models.IntegerField(unique=True)
+    queued_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Pending embedding for book {self.book_id}"
+
+class BookSearchIndex(models.Model):
+    """
+    The SQLite FTS5 table behind ?search= (see books/search.py). It is
+    created and kept in sync by migration 0012's triggers, never written
+    through Django, and does not exist on MySQL.
+    """
+    book = models.OneToOneField(Book, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING,
+                                db_constraint=False, related_name='search_index')
+    title = models.TextField()
+    author = models.TextField()
+    # FTS5 hidden columns: `books_book_fts = '<query>'` is a MATCH, and
+    # `rank` is the bm25() score configured by the migration (lower is better).
+    query = models.TextField(db_column='books_book_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'books_book_fts'
+
+class SimilarBook(models.Model):
+    """
+    Precomputed "more like this" list: `similar` is the `rank`-th nearest
+    neighbour (0 = nearest) of `book` in the FAISS index, at L2 `distance`.
+    Written by books/similar.py; /api/books/{id}/similar/ reads one book's
+    rows through the (book, rank) unique index.
+
+    Deleting a book leaves the rows pointing at it (no constraint), so the
+    next refresh can find and recompute the lists it was in; until then the
+    endpoint's join simply skips it.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    similar = models.ForeignKey(Book, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    distance = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='similar_book_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.similar_id} is #{self.rank + 1} like {self.book_id}"
+
+class RecommendedBook(models.Model):
+    """
+    Precomputed recommendation: `book` is `user`'s `rank`-th suggestion
+    (0 = best). Written by the train_recommender command (see
+    books/recommender.py); /api/profile/recommendations/ reads one user's
+    rows through the (user, rank) unique index. `score` is the model's
+    predicted rating, or null for the most-borrowed books that users
+    without a history get instead.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(null=True)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'rank'], name='recommended_book_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank + 1} for {self.user_id}: {self.book_id}"
+
 class StudentProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     sap_id = models.CharField(max_length=20, null=True, blank=True, default='N/A')
@@ -57,8 +199,16 @@ class BookBorrow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     borrowed_date = models.DateField(auto_now_add=True)
     due_date = models.DateField()
+    returned_date = models.DateField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='BORROWED')
 
+    class Meta:
+        # The admin's overdue list: status = 'BORROWED' AND due_date < today.
+        # Checked by the check_query_plans command, like the ones below.
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} borrowed {self.book.title}"
 
@@ -72,6 +222,12 @@ class StudentQuery(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Pending queries in id order (the admin list's cursor).
+        indexes = [
+            models.Index(fields=['status', 'id'], name='query_status_id_idx'),
+        ]
+
     def __str__(self):
         return f"Query from {self.user.username} ({self.status})"
 
@@ -86,6 +242,15 @@ class BookRequest(models.Model):
     request_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
 
+    class Meta:
+        indexes = [
+            # Pending requests newest first (the admin list's cursor is '-id').
+            models.Index(fields=['status', 'id'], name='request_status_id_idx'),
+            # A user's requests newest first (profile page); also serves
+            # user_id lookups on its own.
+            models.Index(fields=['user', 'request_date'], name='request_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"Request for {self.book.title} by {self.user.username}"
 
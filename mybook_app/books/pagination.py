@@ -0,0 +1,29 @@
+# books/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class BookCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key: every page is a
+    `WHERE id > <last id> ORDER BY id LIMIT n` query, so deep pages cost the
+    same as the first one and books added or removed meanwhile never shift
+    items between pages. Responses look like {"next", "previous", "results"}.
+    """
+    ordering = 'id'
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        # Search results (see search.py) page by rank, ties broken by id.
+        if 'relevance' in queryset.query.annotations:
+            return ('-relevance', 'id')
+        return super().get_ordering(request, queryset, view)
+
+
+class AdminListPagination(CursorPagination):
+    """Same idea for the admin dashboard lists; `ordering` is set per list."""
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,94 @@
+# books/query_cache.py
+import re
+import threading
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(text):
+    """'  Python   Books ' and 'python books' share cache entries."""
+    return _WHITESPACE.sub(' ', text).strip().lower()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded mapping that evicts the least recently used key."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+class ChatCache:
+    """
+    Two LRU layers in front of the chat search:
+
+    * embeddings: normalized query -> query vector. Only depends on the
+      model, so it survives index reloads.
+    * results: (normalized query, k, index version) -> (distances, ids).
+      Dropped as soon as a newer index version (IndexManager.generation)
+      is seen; late writes computed against an older version are ignored.
+    """
+
+    def __init__(self, max_embeddings=1024, max_results=1024):
+        self.embeddings = LRUCache(max_embeddings)
+        self.results = LRUCache(max_results)
+        self._version = None
+        self._version_lock = threading.Lock()
+
+    def _is_current(self, version):
+        if version == self._version:
+            return True
+        with self._version_lock:
+            if self._version is None or version > self._version:
+                self.results.clear()
+                self._version = version
+            return version == self._version
+
+    def get_results(self, query, k, version):
+        if not self._is_current(version):
+            return None
+        return self.results.get((normalize_query(query), k, version))
+
+    def put_results(self, query, k, version, results):
+        if self._is_current(version):
+            self.results.put((normalize_query(query), k, version), results)
+
+    def get_embedding(self, query):
+        return self.embeddings.get(normalize_query(query))
+
+    def put_embedding(self, query, vector):
+        self.embeddings.put(normalize_query(query), vector)
+
+    def stats(self):
+        return {'index_version': self._version, 'embeddings': self.embeddings.stats(), 'results': self.results.stats()}
@@ -0,0 +1,214 @@
+# books/recommender.py
+"""
+Collaborative-filtering recommendations from the borrow/request history,
+served by /api/profile/recommendations/.
+
+Nothing here runs on the request path. The train_recommender command
+(meant for cron, e.g. a nightly full run plus an hourly `--refresh`):
+
+1. turns BookBorrow/BookRequest rows into implicit ratings
+   (INTERACTION_RATINGS), plus NEGATIVE_RATING for a seeded random sample
+   of books each user never touched. With positives only, every book
+   would look equally good to the model;
+2. trains a scikit-surprise SVD on them and saves it to MODEL_FILE_PATH;
+3. scores every book for every user straight from the learned factors
+   (one matrix product per chunk of users instead of a predict() call per
+   pair) and stores the top RECOMMENDATIONS_COUNT unseen books as
+   RecommendedBook rows.
+
+`--refresh` skips training: it reloads the saved model and recomputes only
+the users that have no list yet or have since borrowed/requested a book on
+their list. With the model unchanged, nothing else can change a list.
+Users the model doesn't know (no history at training time) get the
+most-borrowed books they haven't seen.
+
+numpy/surprise are imported inside the functions that need them, so that
+importing this module stays cheap.
+"""
+import logging
+import os
+import random
+import tempfile
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .indexing import id_chunks
+from .models import Book, BookBorrow, BookRequest, RecommendedBook
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE_PATH = 'recommender.model'
+
+# Implicit rating of each kind of interaction (a user's best one counts).
+INTERACTION_RATINGS = {
+    'borrowed': 5.0,
+    'APPROVED': 5.0,
+    'PENDING': 4.0,
+    'REJECTED': 3.0,
+}
+NEGATIVE_RATING = 1.0
+RATING_SCALE = (NEGATIVE_RATING, 5.0)
+
+# Users scored per matrix product in recommend().
+USER_CHUNK_SIZE = 256
+
+
+def load_interactions():
+    """{(user_id, book_id): rating} for every user/book pair with any history."""
+    ratings = {}
+
+    def add(user_id, book_id, rating):
+        key = (user_id, book_id)
+        if ratings.get(key, 0) < rating:
+            ratings[key] = rating
+
+    for user_id, book_id in BookBorrow.objects.values_list('user_id', 'book_id').iterator():
+        add(user_id, book_id, INTERACTION_RATINGS['borrowed'])
+    for user_id, book_id, status in BookRequest.objects.values_list('user_id', 'book_id', 'status').iterator():
+        add(user_id, book_id, INTERACTION_RATINGS[status])
+    return ratings
+
+
+def seen_books(ratings):
+    """{user_id: set of book_ids} of the users in `ratings`."""
+    seen = {}
+    for user_id, book_id in ratings:
+        seen.setdefault(user_id, set()).add(book_id)
+    return seen
+
+
+def training_rows(ratings, negatives=1, seed=0):
+    """
+    (user, book, rating, None) rows for surprise: every interaction plus,
+    per user, `negatives` times as many never-touched books from those with
+    any history, rated NEGATIVE_RATING.
+    """
+    rng = random.Random(seed)
+    rows = [(user_id, book_id, rating, None) for (user_id, book_id), rating in sorted(ratings.items())]
+    books = sorted({book_id for _, book_id in ratings})
+    for user_id, own in sorted(seen_books(ratings).items()):
+        unseen = [book_id for book_id in books if book_id not in own]
+        for book_id in rng.sample(unseen, min(len(unseen), negatives * len(own))):
+            rows.append((user_id, book_id, NEGATIVE_RATING, None))
+    return rows
+
+
+def train(ratings, factors=50, epochs=20, negatives=1, seed=0):
+    """Fits an SVD model on `ratings` (see training_rows)."""
+    from surprise import SVD, Dataset, Reader
+
+    trainset = Dataset(Reader(rating_scale=RATING_SCALE)).construct_trainset(
+        training_rows(ratings, negatives=negatives, seed=seed))
+    algo = SVD(n_factors=factors, n_epochs=epochs, random_state=seed)
+    algo.fit(trainset)
+    return algo
+
+
+def save_model(algo, path=MODEL_FILE_PATH):
+    """Dumps the model to a temp file and renames it into place."""
+    from surprise import dump
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    os.close(fd)
+    try:
+        dump.dump(tmp_path, algo=algo)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_model(path=MODEL_FILE_PATH):
+    """The model saved by the last full run, or None."""
+    from surprise import dump
+
+    if not os.path.exists(path):
+        return None
+    return dump.load(path)[1]
+
+
+def popular_books(ratings):
+    """Book IDs by number of users that interacted with them, most first."""
+    counts = {}
+    for _, book_id in ratings:
+        counts[book_id] = counts.get(book_id, 0) + 1
+    return sorted(counts, key=lambda book_id: (-counts[book_id], book_id))
+
+
+def recommend(algo, user_ids, ratings, count):
+    """
+    {user_id: [(book_id, score), ...]} with each user's `count` best books
+    they haven't borrowed or requested. Users unknown to `algo` get the
+    most popular unseen books with a None score.
+    """
+    import numpy as np
+
+    seen = seen_books(ratings)
+    popular = popular_books(ratings)
+    trainset = algo.trainset
+    items = np.array([trainset.to_raw_iid(inner) for inner in range(trainset.n_items)])
+    item_position = {book_id: inner for inner, book_id in enumerate(items.tolist())}
+    item_bias = (trainset.global_mean + algo.bi).astype('float32')
+    item_factors = algo.qi.astype('float32')
+
+    known = [user_id for user_id in user_ids if _inner_uid(trainset, user_id) is not None]
+    recommendations = {}
+    for start in range(0, len(known), USER_CHUNK_SIZE):
+        chunk = known[start:start + USER_CHUNK_SIZE]
+        inner = [trainset.to_inner_uid(user_id) for user_id in chunk]
+        scores = algo.pu[inner].astype('float32') @ item_factors.T + item_bias + algo.bu[inner, None]
+        for row, user_id in enumerate(chunk):
+            own = [item_position[book_id] for book_id in seen.get(user_id, ()) if book_id in item_position]
+            scores[row, own] = -np.inf
+        # Best `count` per row without sorting whole rows, then only those are sorted.
+        k = min(count, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        for row, user_id in enumerate(chunk):
+            recommendations[user_id] = [(int(items[i]), float(score)) for i, score in
+                                        zip(top[row, order[row]], top_scores[row, order[row]]) if np.isfinite(score)]
+
+    for user_id in user_ids:
+        if user_id not in recommendations:
+            own = seen.get(user_id, set())
+            recommendations[user_id] = [(book_id, None) for book_id in popular if book_id not in own][:count]
+    return recommendations
+
+
+def _inner_uid(trainset, user_id):
+    try:
+        return trainset.to_inner_uid(user_id)
+    except ValueError:
+        return None
+
+
+def users_to_refresh():
+    """Active users with no stored list, or who borrowed/requested a book on it since."""
+    stale = set(User.objects.filter(is_active=True, recommendations__isnull=True).values_list('id', flat=True))
+    for history in (BookBorrow, BookRequest):
+        touched = history.objects.filter(user_id=OuterRef('user_id'), book_id=OuterRef('book_id'))
+        stale.update(RecommendedBook.objects.filter(Exists(touched)).values_list('user_id', flat=True).distinct())
+    return sorted(stale)
+
+
+def store(recommendations):
+    """Replaces the stored lists of the users in `recommendations`."""
+    now = timezone.now()
+    book_ids = {book_id for books in recommendations.values() for book_id, _ in books}
+    existing = set()
+    for chunk in id_chunks(book_ids):
+        existing.update(Book.objects.filter(id__in=chunk).values_list('id', flat=True))
+    with transaction.atomic():
+        for chunk in id_chunks(recommendations):
+            RecommendedBook.objects.filter(user_id__in=chunk).delete()
+        RecommendedBook.objects.bulk_create([
+            RecommendedBook(user_id=user_id, book_id=book_id, rank=rank, score=score, computed_at=now)
+            for user_id, books in recommendations.items()
+            for rank, (book_id, score) in enumerate(
+                (book_id, score) for book_id, score in books if book_id in existing)
+        ], batch_size=1000)
+    logger.info(f"Stored recommendations for {len(recommendations)} user(s).")
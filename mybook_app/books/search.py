@@ -0,0 +1,104 @@
+# books/search.py
+"""
+Full-text search over Book.title and Book.author.
+
+* MySQL: a FULLTEXT index on (title, author), queried in boolean mode.
+* SQLite: an external-content FTS5 table, `books_book_fts`, kept in sync
+  with books_book by triggers and ranked with bm25(). It is joined in
+  through the unmanaged BookSearchIndex model, so the score is computed
+  once per match rather than in a correlated subquery.
+* Any other backend falls back to the old `icontains` filter.
+
+Migration 0012 creates the index and triggers (0018 adds FTS5 prefix
+indexes). Every search term is matched as a prefix ("pyth" finds
+"Python"), and all terms must match; on MySQL, words InnoDB doesn't index
+(stopwords, words shorter than its minimum token size) are left out.
+
+Scoring is what makes broad queries slow, not finding the matches: bm25
+is computed for every match before the best can be picked. On SQLite only
+the MAX_RANKED_MATCHES newest matches are scored, so a 4-letter prefix
+matching half the catalogue costs about as much as a rare word. Older
+matches are still returned, after the ranked ones, in id order.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Subquery, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .models import BookSearchIndex
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+# Broad queries are ranked among this many of their matches (the newest).
+MAX_RANKED_MATCHES = 1000
+
+# InnoDB defaults (innodb_ft_min_token_size, INFORMATION_SCHEMA.
+# INNODB_FT_DEFAULT_STOPWORD); keep in sync if the server is configured
+# differently. These words are not in the FULLTEXT index, so a query that
+# requires one matches nothing.
+MYSQL_MIN_TOKEN_SIZE = 3
+MYSQL_STOPWORDS = frozenset([
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how', 'i', 'in',
+    'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who',
+    'will', 'with', 'und', 'www',
+])
+
+
+def search_terms(text):
+    return _TERM.findall(text.lower())
+
+
+def fulltext_supported():
+    return connection.vendor in ('mysql', 'sqlite')
+
+
+def _mysql_query(terms):
+    """
+    Boolean mode: '+' makes a term required, '*' makes it a prefix.
+    Unindexed words are dropped; '' if none is left.
+    """
+    return ' '.join(f'+{term}*' for term in terms
+                    if len(term) >= MYSQL_MIN_TOKEN_SIZE and term not in MYSQL_STOPWORDS)
+
+
+def _sqlite_query(terms):
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_books(queryset, text):
+    """
+    Filters `queryset` to books whose title or author match `text` and
+    annotates them with `relevance` (higher is better). The caller decides
+    the ordering; BookCursorPagination pages by relevance when it is there.
+    """
+    terms = search_terms(text)
+    query = None
+    if terms and fulltext_supported():
+        query = _mysql_query(terms) if connection.vendor == 'mysql' else _sqlite_query(terms)
+    if not query:
+        # No full-text index, or only words it doesn't contain ('of the').
+        return queryset.filter(Q(title__icontains=text) | Q(author__icontains=text))
+
+    if connection.vendor == 'mysql':
+        table = queryset.model._meta.db_table
+        match = f'MATCH({table}.title, {table}.author) AGAINST (%s IN BOOLEAN MODE)'
+        return queryset.annotate(
+            relevance=RawSQL(match, [query], output_field=FloatField())
+        ).filter(relevance__gt=0)
+
+    # Only matches at or above the rowid of the MAX_RANKED_MATCHES-th newest
+    # one are scored: FTS5 computes `rank` only when the CASE reads it. The
+    # rest are still returned, with relevance 0 (bm25 scores are always
+    # above that once negated), so they page after the ranked ones in id order.
+    newest = (BookSearchIndex.objects.filter(query=query).order_by('-pk')
+              .values('pk')[MAX_RANKED_MATCHES - 1:MAX_RANKED_MATCHES])
+    # bm25 rank is "lower is better", so it is negated to match MySQL.
+    # Filtered after annotating, so the join stays INNER (FTS5 can't MATCH
+    # on the nullable side of a LEFT JOIN).
+    return queryset.annotate(relevance=Case(
+        When(search_index__pk__gte=Coalesce(Subquery(newest), Value(0)), then=-F('search_index__rank')),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )).filter(search_index__query=query)
@@ -1,7 +1,9 @@
 # books/serializers.py
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Book, Category, StudentProfile, BookBorrow, StudentQuery, BookRequest
+from django.db import transaction
+from .models import Book, Category, Section, StudentProfile, BookBorrow, StudentQuery, BookRequest
 
 # --- UserSerializer for registration ---
 class UserSerializer(serializers.ModelSerializer):
@@ -17,7 +19,7 @@ class UserProfileBorrowSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BookBorrow
-        fields = ['title', 'due_date', 'status']
+        fields = ['book_id', 'title', 'due_date', 'status']
         
 # --- BookRequest Serializer for Profile View ---
 class UserProfileRequestSerializer(serializers.ModelSerializer):
@@ -42,29 +44,123 @@ class StudentProfileSerializer(serializers.ModelSerializer):
             'branch_department', 'role', 'borrowed_books', 'requested_books' # Add new field here
         ]
 
+    # Each list is one query: the book title is joined in instead of being
+    # fetched per row, and the book's embedding/description are never loaded.
     def get_borrowed_books(self, obj):
-        borrowed_records = BookBorrow.objects.filter(user=obj.user)
+        borrowed_records = (BookBorrow.objects.filter(user_id=obj.user_id)
+                            .select_related('book').only('due_date', 'status', 'book__title'))
         return UserProfileBorrowSerializer(borrowed_records, many=True).data
 
     def get_requested_books(self, obj):
         """
         This method retrieves and serializes the book requests for the user's profile.
         """
-        requested_records = BookRequest.objects.filter(user=obj.user).order_by('-request_date')
+        requested_records = (BookRequest.objects.filter(user_id=obj.user_id).order_by('-request_date')
+                             .select_related('book').only('request_date', 'status', 'book__title'))
         return UserProfileRequestSerializer(requested_records, many=True).data
 
 
-# --- CategorySerializer ---
+# --- CategorySerializer / SectionSerializer ---
+# `book_count` is annotated by the viewset's queryset (one GROUP BY query);
+# a category that was just created has no books yet.
 class CategorySerializer(serializers.ModelSerializer):
+    book_count = serializers.SerializerMethodField()
+
     class Meta:
         model = Category
-        fields = ('name',)
+        fields = ('id', 'name', 'book_count')
+
+    def get_book_count(self, obj):
+        return getattr(obj, 'book_count', 0)
+
+class SectionSerializer(CategorySerializer):
+    class Meta(CategorySerializer.Meta):
+        model = Section
+
+# --- NamedRelatedField ---
+class NamedRelatedField(serializers.SlugRelatedField):
+    """
+    A Category/Section read and written by name, the way the old free-text
+    columns were; a blank one means none. Validation only cleans the name:
+    the serializer resolves it with `resolve`, once the whole payload is
+    valid, so a rejected request creates no rows.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(slug_field='name', allow_null=True, required=False, **kwargs)
+
+    def to_internal_value(self, data):
+        name = str(data).strip()
+        if not name:
+            return None
+        max_length = self.get_queryset().model._meta.get_field('name').max_length
+        if len(name) > max_length:
+            raise serializers.ValidationError(f'Ensure this field has no more than {max_length} characters.')
+        return name
+
+    def resolve(self, name):
+        """The row called `name` (matched case-insensitively), created if there is none."""
+        return self.get_queryset().get_or_create(name__iexact=name, defaults={'name': name})[0]
+
+# API fields that are the name of a related row rather than a Book column.
+BOOK_NAME_FIELDS = {'section': 'section', 'category_name': 'category'}
+
+def book_columns(fields, prefix=''):
+    """
+    (select_related() paths, only() columns) for serializing `fields` of a
+    Book reached through `prefix` (e.g. 'similar__'): `section` and
+    `category_name` are joined in from Section/Category.
+    """
+    related, columns = [], []
+    for name in fields:
+        if name in BOOK_NAME_FIELDS:
+            related.append(prefix + BOOK_NAME_FIELDS[name])
+            columns.append(f'{prefix}{BOOK_NAME_FIELDS[name]}__name')
+        else:
+            columns.append(prefix + name)
+    return related, columns
+
+# --- DynamicFieldsModelSerializer ---
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Accepts an optional `fields` argument with the subset of Meta.fields to
+    output, e.g. from a `?fields=id,title` sparse fieldset.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 
 # --- BookSerializer ---
-class BookSerializer(serializers.ModelSerializer):
+# embedding/description_hash belong to the AI search and never leave the server.
+class BookSerializer(DynamicFieldsModelSerializer):
+    section = NamedRelatedField(queryset=Section.objects.all())
+    category_name = NamedRelatedField(source='category', queryset=Category.objects.all())
+
     class Meta:
         model = Book
-        fields = "__all__"
+        fields = ('id', 'title', 'author', 'location', 'section', 'category_name', 'description', 'available')
+
+    def resolve_names(self, validated_data):
+        for field in self.fields.values():
+            if isinstance(field, NamedRelatedField) and validated_data.get(field.source):
+                validated_data[field.source] = field.resolve(validated_data[field.source])
+        return validated_data
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            return super().create(self.resolve_names(validated_data))
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            return super().update(instance, self.resolve_names(validated_data))
+
+# --- BookListSerializer: just what the catalogue cards need ---
+class BookListSerializer(BookSerializer):
+    class Meta(BookSerializer.Meta):
+        fields = ('id', 'title', 'author', 'location', 'section', 'category_name', 'available')
 
 # --- OverdueBookSerializer for Admin Dashboard ---
 class OverdueBookSerializer(serializers.ModelSerializer):
@@ -83,6 +179,29 @@ class StudentQuerySerializer(serializers.ModelSerializer):
         model = StudentQuery
         fields = ('id', 'username', 'query_text', 'status', 'created_at')
 
+# --- Batch rent/return input (a stack of books at the desk) ---
+class BatchReturnSerializer(serializers.Serializer):
+    book_ids = serializers.ListField(
+        # Bounded like views.book_id(): a bigger ID overflows the ORM's int64 column.
+        child=serializers.IntegerField(min_value=1, max_value=2 ** 63 - 1),
+        allow_empty=False,
+        max_length=settings.CIRCULATION_BATCH_MAX_SIZE,
+    )
+    # Staff only: the student the books are lent to / returned by.
+    username = serializers.CharField(required=False)
+
+class BatchRentSerializer(BatchReturnSerializer):
+    due_date = serializers.DateField()
+
+# --- Bulk approve/reject input for the Admin Dashboard ---
+class BulkRequestStatusSerializer(serializers.Serializer):
+    request_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=2 ** 63 - 1),
+        allow_empty=False,
+        max_length=settings.MODERATION_BATCH_MAX_SIZE,
+    )
+    status = serializers.ChoiceField(choices=['APPROVED', 'REJECTED'])
+
 # --- BookRequestSerializer for Admin Dashboard ---
 class BookRequestSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
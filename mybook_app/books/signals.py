@@ -1,78 +1,51 @@
 # books/signals.py
 import logging
-import os
-import numpy as np
-import faiss
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from sentence_transformers import SentenceTransformer
+from .indexing import enqueue_book
 from .models import Book
+from .suggest_index import SUGGEST_INDEX
 
 logger = logging.getLogger(__name__)
 
-# --- Load Model ---
-# We load the model once when Django starts
-MODEL_NAME = 'all-MiniLM-L6-v2'
-MODEL = None
-try:
-    logger.info("Signals: Loading SentenceTransformer model...")
-    MODEL = SentenceTransformer(MODEL_NAME)
-    logger.info("Signals: Model loaded successfully.")
-except Exception as e:
-    logger.error(f"Signals: Error loading SentenceTransformer model: {e}")
-
-INDEX_FILE_PATH = 'book_index.faiss'
-
-# --- Signal Receiver ---
+# --- Signal Receivers ---
+# Embedding and FAISS work happens in the `run_index_worker` command. Saves
+# only drop the book ID into the PendingEmbedding queue.
 @receiver(post_save, sender=Book)
-def update_book_embedding(sender, instance, created, **kwargs):
+def update_book_embedding(sender, instance, created, update_fields=None, **kwargs):
     """
-    Automatically update the embedding when a Book is saved.
-    Handles both creation and updates.
+    Queue the book for re-embedding when it is created or its description
+    changes (e.g. toggling `available` is a no-op here). A description
+    named in `update_fields` is always re-embedded.
     """
-    if MODEL is None:
-        logger.error("Signal cannot generate embedding: Model not loaded.")
+    if update_fields is not None:
+        if 'description' not in update_fields:
+            return
+    elif not created and not instance.has_changed('description'):
         return
 
-    if not instance.description:
-        logger.info(f"Book ID {instance.id} has no description, skipping embedding update.")
-        # If description was removed, consider removing from FAISS index too (optional)
-        return
+    enqueue_book(instance.id)
+    logger.info(f"Book ID {instance.id} queued for embedding update.")
 
-    logger.info(f"Signal received: Updating embedding for Book ID {instance.id}...")
 
-    try:
-        # 1. Generate embedding for this specific book
-        embedding = MODEL.encode([instance.description])[0] # Get the first (only) embedding
-        embedding_list = embedding.tolist()
+@receiver(post_delete, sender=Book)
+def remove_book_embedding(sender, instance, **kwargs):
+    """Queue the deleted book so the worker drops it from the index."""
+    enqueue_book(instance.id)
 
-        # Avoid triggering the signal again by using update()
-        # This saves only the 'embedding' field directly to the database.
-        Book.objects.filter(pk=instance.id).update(embedding=embedding_list)
-        logger.info(f"Embedding saved to database for Book ID {instance.id}.")
 
-        # 2. Update the FAISS index
-        if not os.path.exists(INDEX_FILE_PATH):
-            logger.warning(f"FAISS index file not found at {INDEX_FILE_PATH}. Cannot update index.")
-            # You might want to run generate_embeddings command here to create it.
+# The typeahead index lives in memory, so it is updated right away (for
+# this process; other processes catch up on their next rebuild).
+@receiver(post_save, sender=Book)
+def update_book_suggestions(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None:
+        if not {'title', 'author'} & set(update_fields):
             return
+    elif not created and not (instance.has_changed('title') or instance.has_changed('author')):
+        return
+    SUGGEST_INDEX.add(instance.id, instance.title, instance.author)
 
-        # Load the existing index
-        index = faiss.read_index(INDEX_FILE_PATH)
-
-        # FAISS IDs must be int64
-        book_id_to_update = np.array([instance.id]).astype('int64')
-        embedding_to_update = np.array([embedding]).astype('float32')
-
-        # Remove the old vector (if it exists)
-        index.remove_ids(book_id_to_update)
-
-        # Add the new/updated vector
-        index.add_with_ids(embedding_to_update, book_id_to_update)
-
-        # Save the updated index back to the file
-        faiss.write_index(index, INDEX_FILE_PATH)
-        logger.info(f"FAISS index updated and saved for Book ID {instance.id}.")
 
-    except Exception as e:
-        logger.error(f"Error updating embedding for Book ID {instance.id}: {e}")
\ No newline at end of file
+@receiver(post_delete, sender=Book)
+def remove_book_suggestions(sender, instance, **kwargs):
+    SUGGEST_INDEX.remove(instance.id)
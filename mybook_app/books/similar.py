@@ -0,0 +1,167 @@
+# books/similar.py
+"""
+Precomputed "more like this" lists behind /api/books/{id}/similar/.
+
+For every book in the FAISS index, its SIMILAR_BOOKS_COUNT nearest
+neighbours are stored as SimilarBook rows, so the endpoint is one indexed
+lookup instead of a vector search per request.
+
+* `compute_all` (the compute_similar_books command) rebuilds every list.
+* `refresh` updates the lists after some embeddings changed; the index
+  worker and generate_embeddings call it with the books they touched. It
+  recomputes the lists of those books, of every book whose list contains
+  one of them, and of their new neighbours that they now come closer to
+  than that neighbour's current last entry. kNN isn't symmetric, so a
+  changed book can still belong in the list of a book outside its own top
+  N; those are only caught by the next full compute_similar_books run.
+
+Book vectors are read back from the index, never re-encoded. IVF-PQ only
+keeps lossy codes, so for it the stored Book.embedding is used instead.
+Both search with the API's FAISS_NPROBE / FAISS_EF_SEARCH, whoever loaded
+the index.
+
+numpy/faiss are imported inside the functions that need them, so that
+importing this module (which views.py does at startup) stays cheap.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .embeddings import unpack_embedding
+from .index_manager import apply_search_params
+from .indexing import id_chunks, index_ids, reconstruct_vectors
+from .models import Book, SimilarBook
+
+logger = logging.getLogger(__name__)
+
+
+def stored_vectors(ids):
+    """Vectors of `ids` decoded from Book.embedding, in the same order."""
+    import numpy as np
+
+    rows = {}
+    for chunk in id_chunks(ids):
+        rows.update(Book.objects.filter(id__in=chunk).values_list('id', 'embedding'))
+    return np.stack([unpack_embedding(rows[int(book_id)])[1] for book_id in ids])
+
+
+def vectors_for(index, ids):
+    """Vectors of `ids` (all of which must be in `index`), in the same order."""
+    vectors = reconstruct_vectors(index, ids)
+    return vectors if vectors is not None else stored_vectors(ids)
+
+
+def index_vector(index, book_id):
+    """
+    One book's vector, or None if it isn't in `index`. Unlike vectors_for
+    this never modifies the index, so it is safe on the shared copy
+    request threads search.
+    """
+    import numpy as np
+    import faiss
+
+    if isinstance(index, faiss.IndexIDMap):
+        positions = np.flatnonzero(faiss.vector_to_array(index.id_map) == book_id)
+        if not len(positions):
+            return None
+        return faiss.downcast_index(index.index).reconstruct(int(positions[0]))
+    embedding = (Book.objects.filter(pk=book_id, embedding__isnull=False)
+                 .values_list('embedding', flat=True).first())
+    return unpack_embedding(embedding)[1] if embedding is not None else None
+
+
+def nearest(index, ids, vectors, count):
+    """{book id: [(neighbour id, distance), ...]} of the `count` nearest other books."""
+    import numpy as np
+
+    distances, neighbours = index.search(np.asarray(vectors, dtype='float32').reshape(len(ids), -1), count + 1)
+    return {
+        int(book_id): [(int(n), float(d)) for n, d in zip(row_ids, row_distances)
+                       if n != -1 and n != book_id][:count]
+        for book_id, row_ids, row_distances in zip(ids, neighbours, distances)
+    }
+
+
+def use_api_search_params(index):
+    """Sets FAISS_NPROBE / FAISS_EF_SEARCH on `index`, so lists match what a live search would return."""
+    apply_search_params(index, {'nprobe': settings.FAISS_NPROBE, 'efSearch': settings.FAISS_EF_SEARCH})
+
+
+def save_lists(lists, clear=()):
+    """Replaces the stored lists of the books in `lists` and drops those of the books in `clear`."""
+    with transaction.atomic():
+        for chunk in id_chunks(set(lists) | set(clear)):
+            SimilarBook.objects.filter(book_id__in=chunk).delete()
+        SimilarBook.objects.bulk_create([
+            SimilarBook(book_id=book_id, similar_id=similar_id, rank=rank, distance=distance)
+            for book_id, neighbours in lists.items()
+            for rank, (similar_id, distance) in enumerate(neighbours)
+        ], batch_size=1000)
+
+
+def compute_all(index, count=None, chunk_size=1000):
+    """Recomputes every book's list. Returns the number of books with a list."""
+    import numpy as np
+
+    count = count or settings.SIMILAR_BOOKS_COUNT
+    use_api_search_params(index)
+    ids = np.sort(index_ids(index))
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        save_lists(nearest(index, chunk, vectors_for(index, chunk), count))
+
+    indexed = set(ids.tolist())
+    dropped = set(SimilarBook.objects.values_list('book_id', flat=True).distinct()) - indexed
+    save_lists({}, clear=dropped)
+    return len(ids)
+
+
+def refresh(index, changed_ids, count=None):
+    """
+    Updates the lists affected by new/changed/removed vectors of
+    `changed_ids` (see the module docstring). Returns the number of lists
+    recomputed.
+    """
+    import numpy as np
+
+    count = count or settings.SIMILAR_BOOKS_COUNT
+    changed = {int(book_id) for book_id in changed_ids}
+    if not changed:
+        return 0
+    use_api_search_params(index)
+    indexed = set(index_ids(index).tolist())
+    present = sorted(changed & indexed)
+    if len(present) > len(indexed) // 2:
+        return compute_all(index, count)
+
+    lists = nearest(index, present, vectors_for(index, present), count) if present else {}
+
+    # Lists that contain a changed book are out of date whatever happened to it.
+    recompute = set()
+    for chunk in id_chunks(changed):
+        recompute.update(SimilarBook.objects.filter(similar_id__in=chunk).values_list('book_id', flat=True))
+
+    # A changed book's new neighbours get it in their list if it is now
+    # closer than their last entry (or their list isn't full).
+    closest = {}
+    for neighbours in lists.values():
+        for similar_id, distance in neighbours:
+            closest[similar_id] = min(distance, closest.get(similar_id, np.inf))
+    current = {}
+    for chunk in id_chunks(closest):
+        current.update((book_id, (length, worst)) for book_id, length, worst in (
+            SimilarBook.objects.filter(book_id__in=chunk).values('book_id')
+            .annotate(length=Count('id'), worst=Max('distance')).values_list('book_id', 'length', 'worst')))
+    for book_id, distance in closest.items():
+        length, worst = current.get(book_id, (0, None))
+        if length < count or distance < worst:
+            recompute.add(book_id)
+
+    others = sorted((recompute - set(lists)) & indexed)
+    if others:
+        lists.update(nearest(index, others, vectors_for(index, others), count))
+    save_lists(lists, clear=changed - set(lists))
+    logger.info(f"Similar books: recomputed {len(lists)} list(s) for {len(changed)} changed book(s).")
+    return len(lists)
@@ -0,0 +1,314 @@
+# books/suggest_index.py
+"""
+In-process typeahead index over book titles and authors, behind
+/api/books/suggest/.
+
+* vocabulary: every distinct word, kept sorted, so all words starting with
+  a prefix are one bisect away (a flattened prefix trie);
+* postings: word -> the books whose title or author contain it, sorted
+  shortest title first, so the best books for a set of words come out of
+  a lazy merge without looking at the rest;
+* trigrams: trigram -> words containing it, used to find words within a
+  typo or two of what was typed.
+
+Every process builds its own copy from the database on first use (wsgi.py
+starts that in the background at startup). Book saves and deletes made in
+the same process are applied through signals; writes made by other
+processes are picked up by a background rebuild once the copy is older
+than `max_age` seconds. A process forked from one that has a copy (e.g.
+gunicorn --preload workers) starts with that copy; a build that was still
+running in the parent is started over in the child on first use.
+"""
+import bisect
+import heapq
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# Matches below this trigram similarity are not considered typos of each other.
+MIN_SIMILARITY = 0.3
+# Trigrams shared by more words than this (e.g. '  s') say little about a
+# word and would make fuzzy lookups slow, so they are skipped.
+MAX_TRIGRAM_WORDS = 2000
+# Upper bound on books scored per query, however short the prefix. Also,
+# once a term's prefix matches cover this many books, no typos are looked up.
+MAX_CANDIDATES = 2000
+# Words kept per query term after fuzzy matching.
+MAX_FUZZY_WORDS = 64
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+FUZZY_SCORE = 0.8  # times the similarity
+
+
+def normalize_words(text):
+    """'Cien años de Soledad' -> ['cien', 'anos', 'de', 'soledad']"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _WORD.findall(text.lower())
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets, like pg_trgm."""
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def deep_sizeof(root):
+    """Approximate bytes held by `root` and the containers/strings it references."""
+    seen, stack, total = set(), [root], 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+class _Data:
+    """The index structures; not thread-safe on its own (see SuggestIndex)."""
+
+    def __init__(self):
+        self.vocabulary = []   # sorted distinct words
+        self.postings = {}     # word -> sorted list of book keys
+        self.trigrams = {}     # trigram -> set of words
+        self.books = {}        # book id -> (title, author, frozenset of words, key)
+
+    def add(self, book_id, title, author):
+        self.remove(book_id)
+        words = frozenset(normalize_words(title) + normalize_words(author))
+        # Among equally good matches, shorter titles come first.
+        key = (len(title), title.lower(), book_id)
+        self.books[book_id] = (title, author or '', words, key)
+        for word in words:
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = []
+                bisect.insort(self.vocabulary, word)
+                for gram in trigrams(word):
+                    self.trigrams.setdefault(gram, set()).add(word)
+            bisect.insort(posting, key)
+
+    def remove(self, book_id):
+        entry = self.books.pop(book_id, None)
+        if entry is None:
+            return
+        for word in entry[2]:
+            posting = self.postings[word]
+            del posting[bisect.bisect_left(posting, entry[3])]
+            if posting:
+                continue
+            del self.postings[word]
+            del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+            for gram in trigrams(word):
+                words = self.trigrams[gram]
+                words.discard(word)
+                if not words:
+                    del self.trigrams[gram]
+
+    def match_term(self, term):
+        """{word: score} for every vocabulary word that `term` may stand for."""
+        matches = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(self.vocabulary, term + '\U0010ffff', start)
+        for word in self.vocabulary[start:end]:
+            matches[word] = EXACT_SCORE if word == term else PREFIX_SCORE
+
+        if (len(term) >= 3 and matches.get(term) != EXACT_SCORE
+                and sum(len(self.postings[word]) for word in matches) < MAX_CANDIDATES):
+            grams = trigrams(term)
+            shared = Counter()
+            for gram in grams:
+                words = self.trigrams.get(gram, ())
+                if len(words) <= MAX_TRIGRAM_WORDS:
+                    shared.update(words)
+            fuzzy = []
+            for word, _ in shared.most_common(MAX_FUZZY_WORDS * 2):
+                if word in matches:
+                    continue
+                # Compare with the whole word and with its first len(term)
+                # letters, so half-typed misspellings ('pyhto') still match.
+                score = max(similarity(grams, trigrams(word)), similarity(grams, trigrams(word[:len(term)])))
+                if score >= MIN_SIMILARITY:
+                    fuzzy.append((score, word))
+            for score, word in sorted(fuzzy, reverse=True)[:MAX_FUZZY_WORDS]:
+                matches[word] = FUZZY_SCORE * score
+        return matches
+
+    def ranked(self, term_matches):
+        """(score, key) of every book matching a term, best first."""
+        tiers = {}
+        for word, score in term_matches.items():
+            tiers.setdefault(score, []).append(self.postings[word])
+        seen = set()
+        for score in sorted(tiers, reverse=True):
+            for key in heapq.merge(*tiers[score]):
+                if key[2] not in seen:
+                    seen.add(key[2])
+                    yield score, key
+
+    def suggest(self, query, limit):
+        terms = normalize_words(query)
+        if not terms:
+            return []
+        matches = [self.match_term(term) for term in terms]
+        if not all(matches):
+            return []
+
+        # Candidates come from the most selective term, best first; the other
+        # terms are scored against each candidate's own words. With a single
+        # term the first `limit` candidates are already the answer.
+        driver = min(range(len(terms)), key=lambda i: sum(len(self.postings[w]) for w in matches[i]))
+        others = [term_matches for i, term_matches in enumerate(matches) if i != driver]
+        scored = []
+        for score, key in itertools.islice(self.ranked(matches[driver]), MAX_CANDIDATES):
+            words = self.books[key[2]][2]
+            for term_matches in others:
+                best = max((term_matches.get(word, 0.0) for word in words), default=0.0)
+                if not best:
+                    break
+                score += best
+            else:
+                scored.append((-score, key))
+                if not others and len(scored) >= limit:
+                    break
+
+        return [
+            {'id': key[2], 'title': self.books[key[2]][0], 'author': self.books[key[2]][1]}
+            for _, key in heapq.nsmallest(limit, scored)
+        ]
+
+
+class SuggestIndex:
+    """
+    Thread-safe, lazily built wrapper around _Data. `add`/`remove` made
+    while a rebuild is running are replayed on the new copy.
+    """
+
+    def __init__(self, max_age=300.0):
+        self.max_age = max_age
+        self._data = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._pending = None  # list of ops while a build runs, else None
+        self.built_at = None
+        self.build_seconds = None
+        self.memory_bytes = None
+        self.builds = 0
+        if hasattr(os, 'register_at_fork'):  # POSIX only
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Only the forking thread survives in the child, so a lock held by
+        # another thread (a warm-up build) would never be released there.
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        if self._pending is not None or self.built_at is None:
+            # Forked mid-build: nothing will finish it, so start over.
+            self._pending = None
+            self._data = None
+
+    def _load(self):
+        from .models import Book
+        from .indexing import iter_chunks
+
+        data = _Data()
+        for rows in iter_chunks(Book.objects.all(), ('id', 'title', 'author'), chunk_size=5000):
+            for book_id, title, author in rows:
+                data.add(book_id, title, author)
+        return data
+
+    def build(self):
+        """(Re)builds the index from the database. Concurrent calls build once."""
+        if not self._build_lock.acquire(blocking=False):
+            with self._build_lock:  # someone else is building: wait for it
+                return
+        try:
+            with self._lock:
+                self._pending = []
+            started = time.perf_counter()
+            data = self._load()
+            memory = deep_sizeof(data.__dict__)
+            with self._lock:
+                for op, args in self._pending:
+                    getattr(data, op)(*args)
+                self._pending = None
+                self._data = data
+                self.built_at = time.monotonic()
+                self.build_seconds = time.perf_counter() - started
+                self.memory_bytes = memory
+                self.builds += 1
+            logger.info(f"Suggest index built: {len(data.books)} books, {len(data.vocabulary)} words, "
+                        f"{memory / 1024 / 1024:.1f} MiB in {self.build_seconds:.2f}s")
+        except Exception as e:
+            with self._lock:
+                self._pending = None
+            logger.error(f"Building the suggest index failed: {e}")
+        finally:
+            self._build_lock.release()
+
+    def warm_up(self):
+        """Starts building in a background thread (called from wsgi.py)."""
+        threading.Thread(target=self.build, name='suggest-index', daemon=True).start()
+
+    def _apply(self, op, *args):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((op, args))
+            if self._data is not None:
+                getattr(self._data, op)(*args)
+
+    def add(self, book_id, title, author):
+        self._apply('add', book_id, title, author)
+
+    def remove(self, book_id):
+        self._apply('remove', book_id)
+
+    def suggest(self, query, limit=8):
+        """Top `limit` books for a partially typed, possibly misspelled query."""
+        if self._data is None:
+            self.build()
+        elif self.max_age and time.monotonic() - self.built_at > self.max_age and not self._build_lock.locked():
+            self.warm_up()
+        with self._lock:
+            if self._data is None:
+                return []
+            return self._data.suggest(query, limit)
+
+    def stats(self):
+        data = self._data
+        return {
+            'built': data is not None,
+            'books': len(data.books) if data else 0,
+            'words': len(data.vocabulary) if data else 0,
+            'trigrams': len(data.trigrams) if data else 0,
+            'memory_bytes': self.memory_bytes,
+            'build_seconds': self.build_seconds,
+            'age_seconds': time.monotonic() - self.built_at if self.built_at is not None else None,
+            'builds': self.builds,
+        }
+
+
+SUGGEST_INDEX = SuggestIndex(max_age=settings.SUGGEST_INDEX_MAX_AGE)
@@ -1,3 +1,1164 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import faiss
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import embeddings
+from . import views
+from .chat_batcher import ChatBatcher
+from .query_cache import ChatCache, LRUCache
+from .index_manager import IndexManager
+from .embeddings import pack_embedding
+from .indexing import (
+    build_index,
+    check_consistency,
+    index_ids,
+    index_type_of,
+    index_write_lock,
+    process_pending,
+    write_index_atomic,
+)
+from .management.commands.benchmark_checkout import contend
+from .management.commands.benchmark_startup import HEAVY_MODULES, profile_startup
+from .management.commands.check_query_plans import full_scans
+from .models import (
+    Book,
+    BookBorrow,
+    BookRequest,
+    PendingEmbedding,
+    Category,
+    RecommendedBook,
+    Section,
+    SimilarBook,
+    StudentProfile,
+    StudentQuery,
+)
+from .search import _mysql_query, search_books, search_terms
+from .similar import compute_all, refresh as refresh_similar_books
+from .suggest_index import SUGGEST_INDEX, SuggestIndex
+
+
+def fake_encode(texts, **kwargs):
+    return np.ones((len(texts), 384), dtype='float32')
+
+
+def fake_model():
+    model = mock.Mock()
+    model.encode.side_effect = fake_encode
+    model.get_sentence_embedding_dimension.return_value = 384
+    return model
+
+
+class BookEmbeddingSignalTests(TestCase):
+    """
+    Saving a Book must never encode or touch the FAISS file on the request
+    path, and must only queue work when the description changes.
+    """
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet epic.')
+        PendingEmbedding.objects.all().delete()
+
+        self.faiss_io = []
+        for name in ('read_index', 'write_index'):
+            patcher = mock.patch(f'faiss.{name}')
+            self.faiss_io.append(patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def assertNoEmbeddingWork(self):
+        for io_call in self.faiss_io:
+            io_call.assert_not_called()
+
+    def test_new_book_is_queued(self):
+        book = Book.objects.create(title='Emma', description='A comedy of manners.')
+        self.assertTrue(PendingEmbedding.objects.filter(book_id=book.id).exists())
+        self.assertNoEmbeddingWork()
+
+    def test_availability_toggle_skips_embedding(self):
+        book = Book.objects.get(pk=self.book.pk)
+        book.available = False
+        book.save()
+        self.assertFalse(PendingEmbedding.objects.exists())
+        self.assertNoEmbeddingWork()
+
+    def test_rent_skips_embedding(self):
+        user = User.objects.create_user(username='student', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(f'/api/books/{self.book.pk}/rent/', {'due_date': '2030-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(PendingEmbedding.objects.exists())
+        self.assertNoEmbeddingWork()
+
+    def test_description_changes_coalesce(self):
+        book = Book.objects.get(pk=self.book.pk)
+        book.description = 'Politics and ecology on Arrakis.'
+        self.assertEqual(book.get_dirty_fields(), {'description'})
+        book.save()
+        self.assertEqual(book.get_dirty_fields(), set())
+        book.description = 'Spice, sandworms and prophecy.'
+        book.save()
+        self.assertEqual(PendingEmbedding.objects.filter(book_id=book.id).count(), 1)
+        self.assertNoEmbeddingWork()
+
+    def test_deferred_fields_are_tracked_once_assigned(self):
+        book = Book.objects.only('id', 'title').get(pk=self.book.pk)
+        self.assertEqual(book.description, 'Desert planet epic.')  # loaded on access: still clean
+        self.assertEqual(book.get_dirty_fields(), set())
+
+        self.addCleanup(setattr, SUGGEST_INDEX, '_data', None)
+        SUGGEST_INDEX.build()
+        book = Book.objects.only('id', 'title').get(pk=self.book.pk)
+        book.description = 'Politics and ecology on Arrakis.'
+        book.author = 'F. Herbert'
+        self.assertEqual(book.get_dirty_fields(), {'description', 'author'})
+        book.save()
+        self.assertTrue(PendingEmbedding.objects.filter(book_id=book.id).exists())
+        self.assertEqual([item['author'] for item in SUGGEST_INDEX.suggest('dune')], ['F. Herbert'])
+
+
+class IndexWorkerTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.index_path = os.path.join(self.tmpdir, 'book_index.faiss')
+
+    def test_batch_is_encoded_once_and_published_atomically(self):
+        dune = Book.objects.create(title='Dune', description='Desert planet epic.')
+        emma = Book.objects.create(title='Emma', description='A comedy of manners.')
+        gone = Book.objects.create(title='Gone', description='Soon deleted.')
+        gone.delete()
+        model = fake_model()
+
+        handled = process_pending(model, path=self.index_path)
+
+        self.assertEqual(handled, 3)
+        model.encode.assert_called_once_with(['Desert planet epic.', 'A comedy of manners.'])
+        self.assertFalse(PendingEmbedding.objects.exists())
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['book_index.faiss', 'book_index.faiss.lock'])
+        index = faiss.read_index(self.index_path)
+        self.assertEqual(index.ntotal, 2)
+        for book in (dune, emma):
+            model_name, vector = embeddings.unpack_embedding(Book.objects.get(pk=book.pk).embedding)
+            self.assertEqual(model_name, embeddings.MODEL_NAME)
+            self.assertEqual(vector.shape, (384,))
+
+
+class IndexManagerTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.index_path = os.path.join(self.tmpdir, 'book_index.faiss')
+
+    def publish(self, ids):
+        index = faiss.IndexIDMap(faiss.IndexFlatL2(4))
+        index.add_with_ids(np.ones((len(ids), 4), dtype='float32'), np.array(ids, dtype='int64'))
+        write_index_atomic(index, self.index_path)
+
+    def test_reloads_in_background_when_file_changes(self):
+        manager = IndexManager(self.index_path, check_interval=0)
+        self.assertIsNone(manager.get())
+
+        self.publish([1])
+        first = manager.get()
+        self.assertEqual(first.ntotal, 1)
+        self.assertEqual(manager.generation, 1)
+
+        self.publish([1, 2, 3])
+        self.assertIsNotNone(manager.get())  # never blocks or returns None mid-reload
+        deadline = time.monotonic() + 5
+        while manager.generation < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(manager.get().ntotal, 3)
+        stats = manager.stats()
+        self.assertEqual(stats['reload_count'], 2)
+        self.assertTrue(stats['mmap'])
+        self.assertEqual(stats['reload_failures'], 0)
+        self.assertIsNotNone(stats['last_reload_seconds'])
+
+    def test_callers_wait_for_the_first_load(self):
+        self.publish([1, 2])
+        manager = IndexManager(self.index_path)
+        loading = threading.Event()
+        read_index = faiss.read_index
+
+        def slow_read_index(*args):
+            loading.set()
+            time.sleep(0.2)
+            return read_index(*args)
+
+        results = []
+        with mock.patch('faiss.read_index', side_effect=slow_read_index):
+            first = threading.Thread(target=lambda: results.append(manager.get()))
+            first.start()
+            self.assertTrue(loading.wait(5))
+            results.append(manager.get())  # arrives mid-load
+            first.join()
+        self.assertEqual([index.ntotal if index is not None else None for index in results], [2, 2])
+        self.assertEqual(manager.reload_count, 1)
+
+    def test_search_params_are_applied_to_ann_indexes(self):
+        vectors = np.random.default_rng(0).random((2000, 8), dtype='float32')
+        write_index_atomic(build_index(vectors, np.arange(2000), index_type='ivf', nlist=16), self.index_path)
+        manager = IndexManager(self.index_path, search_params={'nprobe': 7, 'efSearch': 32})
+        index = manager.get()
+        self.assertEqual(faiss.extract_index_ivf(index).nprobe, 7)
+        self.assertEqual(index.search(vectors[:1], 1)[1][0][0], 0)
+
+
+class PackedEmbeddingTests(TestCase):
+
+    def test_round_trip(self):
+        vector = np.linspace(-1, 1, 384, dtype='float32')
+        for dtype, tolerance, size in (('float32', 0, 1536), ('float16', 1e-3, 768), ('int8', 1e-2, 388)):
+            packed = embeddings.pack_embedding(vector, dtype=dtype)
+            model_name, decoded = embeddings.unpack_embedding(packed)
+            self.assertEqual(model_name, embeddings.MODEL_NAME)
+            self.assertEqual(len(packed) - 8 - len(model_name), size)
+            np.testing.assert_allclose(decoded, vector, atol=tolerance)
+
+    def test_float32_decode_is_zero_copy(self):
+        packed = embeddings.pack_embedding(np.ones(4, dtype='float32'))
+        _, decoded = embeddings.unpack_embedding(packed)
+        self.assertIs(decoded.base, packed)
+
+
+class SharedModelTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(embeddings, _model=None, _load_failed=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_model_is_loaded_once_per_process(self):
+        with mock.patch('sentence_transformers.SentenceTransformer') as constructor:
+            first = embeddings.get_model()
+            second = embeddings.get_model()
+        constructor.assert_called_once_with(embeddings.MODEL_NAME)
+        self.assertIs(first, second)
+
+    def test_load_failure_is_not_retried(self):
+        with mock.patch('sentence_transformers.SentenceTransformer', side_effect=OSError('offline')) as constructor:
+            self.assertIsNone(embeddings.get_model())
+            self.assertIsNone(embeddings.get_model())
+        constructor.assert_called_once()
+
+
+class StartupImportTests(TestCase):
+    """Non-AI commands must not pay for importing torch/faiss."""
+
+    def test_check_does_not_import_ai_stack(self):
+        _, imports = profile_startup(['check'])
+        self.assertIn('django', imports)
+        self.assertEqual([name for name in HEAVY_MODULES if name in imports], [])
+
+
+class ChatBatcherTests(TestCase):
+
+    def setUp(self):
+        # Book i is the unit vector e_i; the query text 'i' encodes to e_i.
+        self.index = faiss.IndexIDMap(faiss.IndexFlatL2(8))
+        self.index.add_with_ids(np.eye(8, dtype='float32'), np.arange(100, 108, dtype='int64'))
+        self.model = mock.Mock()
+        self.model.encode.side_effect = lambda texts: np.eye(8, dtype='float32')[[int(t) for t in texts]]
+
+    def test_concurrent_queries_share_one_batch(self):
+        batcher = ChatBatcher(lambda: self.model, lambda: self.index, max_batch_size=8, max_wait=5)
+        results = {}
+
+        def ask(i):
+            results[i] = batcher.search(str(i), k=2)
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.model.encode.assert_called_once()
+        for i in range(8):
+            distances, ids = results[i]
+            self.assertEqual(len(ids), 2)
+            self.assertEqual(ids[0], 100 + i)
+            self.assertEqual(distances[0], 0)
+
+    def test_errors_reach_every_caller(self):
+        batcher = ChatBatcher(lambda: None, lambda: self.index, max_batch_size=1, max_wait=0)
+        with self.assertRaises(RuntimeError):
+            batcher.search('1', k=3)
+
+
+class ChatCacheTests(TestCase):
+
+    def setUp(self):
+        self.index = faiss.IndexIDMap(faiss.IndexFlatL2(8))
+        self.index.add_with_ids(np.eye(8, dtype='float32'), np.arange(8, dtype='int64'))
+        self.model = mock.Mock()
+        self.model.encode.side_effect = lambda texts: np.eye(8, dtype='float32')[[len(t.split()) for t in texts]]
+        self.version = 1
+        self.cache = ChatCache(max_embeddings=4, max_results=4)
+        self.batcher = ChatBatcher(lambda: self.model, lambda: self.index, max_batch_size=1, max_wait=0,
+                                   cache=self.cache, get_version=lambda: self.version)
+
+    def test_repeated_query_skips_model(self):
+        first = self.batcher.search('python books', k=3)
+        second = self.batcher.search('  Python   BOOKS ', k=3)
+        self.model.encode.assert_called_once()
+        self.assertEqual(list(first[1]), list(second[1]))
+        self.assertEqual(self.cache.stats()['results']['hits'], 1)
+
+    def test_index_version_change_invalidates_results_not_embeddings(self):
+        self.batcher.search('data structures', k=3)
+        self.version = 2
+        self.batcher.search('data structures', k=3)
+        self.model.encode.assert_called_once()  # embedding reused
+        self.assertEqual(self.cache.stats()['results']['hits'], 0)
+        self.assertEqual(self.cache.stats()['embeddings']['hits'], 1)
+
+    def test_lru_eviction(self):
+        lru = LRUCache(2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.get('a')
+        lru.put('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.stats()['size'], 2)
+
+
+class GenerateEmbeddingsTests(TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.index_path = os.path.join(tmpdir, 'book_index.faiss')
+        self.model = fake_model()
+        for target, value in (('generate_embeddings.get_model', lambda: self.model),
+                              ('generate_embeddings.INDEX_FILE_PATH', self.index_path),
+                              ('rebuild_index.INDEX_FILE_PATH', self.index_path)):
+            patcher = mock.patch(f'books.management.commands.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.books = [Book.objects.create(title=f'Book {i}', description=f'Description {i}') for i in range(5)]
+
+    def run_command(self, **options):
+        self.model.encode.reset_mock()
+        out = StringIO()
+        call_command('generate_embeddings', chunk_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def encoded_texts(self):
+        return [text for call in self.model.encode.call_args_list for text in call.args[0]]
+
+    def test_reruns_only_encode_changed_descriptions(self):
+        self.run_command()
+        self.assertEqual(len(self.encoded_texts()), 5)
+        self.assertEqual(faiss.read_index(self.index_path).ntotal, 5)
+
+        output = self.run_command()
+        self.model.encode.assert_not_called()
+        self.assertIn('already up to date', output)
+
+        Book.objects.filter(pk=self.books[1].pk).update(description='Rewritten')
+        self.books[3].delete()
+        self.run_command()
+        self.assertEqual(self.encoded_texts(), ['Rewritten'])
+        index = faiss.read_index(self.index_path)
+        self.assertEqual(sorted(index_ids(index)), sorted(b.pk for b in self.books if b.pk))
+
+    def test_in_place_run_re_adds_books_missing_from_index(self):
+        self.run_command()
+        index = faiss.read_index(self.index_path)
+        index.remove_ids(np.array([self.books[2].pk], dtype='int64'))
+        write_index_atomic(index, self.index_path)
+
+        output = self.run_command()
+        self.model.encode.assert_not_called()
+        self.assertNotIn('already up to date', output)
+        self.assertEqual(sorted(index_ids(faiss.read_index(self.index_path))), sorted(b.pk for b in self.books))
+
+    def test_index_writers_wait_for_each_other(self):
+        events = []
+
+        def second_writer():
+            with index_write_lock(self.index_path):
+                events.append('second')
+
+        with index_write_lock(self.index_path):
+            thread = threading.Thread(target=second_writer)
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            events.append('first done')
+        thread.join()
+        self.assertEqual(events, ['first done', 'second'])
+
+    def test_ivf_index_keeps_correct_labels_after_removal(self):
+        self.run_command(index_type='ivf')
+        self.books[0].delete()
+        self.run_command()
+        index = faiss.read_index(self.index_path)
+        _, labels = index.search(np.ones((1, 384), dtype='float32'), 10)
+        expected = sorted(b.pk for b in self.books if b.pk)
+        self.assertEqual(sorted(label for label in labels[0] if label != -1), expected)
+        self.assertEqual(sorted(index_ids(index)), expected)
+
+    def test_rebuild_uses_stored_embeddings(self):
+        self.run_command()
+        self.run_command(rebuild=True)
+        self.model.encode.assert_not_called()
+        self.assertEqual(faiss.read_index(self.index_path).ntotal, 5)
+
+    def test_rebuild_index_from_db_does_not_load_model(self):
+        self.run_command()
+        os.remove(self.index_path)
+        self.model.encode.reset_mock()
+        with mock.patch('books.management.commands.generate_embeddings.get_model') as get_model:
+            call_command('rebuild_index', from_db=True, check=True, index_type='hnsw', stdout=StringIO())
+        get_model.assert_not_called()
+        index = faiss.read_index(self.index_path)
+        self.assertEqual(index_type_of(index), 'hnsw')
+        self.assertEqual(sorted(index_ids(index)), sorted(b.pk for b in self.books))
+
+    def test_consistency_check_reports_each_problem(self):
+        self.run_command()
+        stale, mismatched, deleted = self.books[:3]
+        Book.objects.filter(pk=stale.pk).update(description='Edited behind the signal')
+        Book.objects.filter(pk=mismatched.pk).update(embedding=pack_embedding(np.zeros(384)))
+        Book.objects.filter(pk=deleted.pk).delete()
+        unencoded = Book.objects.create(title='New', description='Not encoded yet')
+
+        problems, compared = check_consistency(faiss.read_index(self.index_path), chunk_size=2)
+        self.assertEqual(problems['stale_embedding'], [stale.pk])
+        self.assertEqual(problems['vector_mismatch'], [mismatched.pk])
+        self.assertEqual(problems['orphaned'], [deleted.pk])
+        self.assertEqual(problems['missing_embedding'], [unencoded.pk])
+        self.assertEqual(compared, 4)
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_index', check=True, stdout=out)
+        self.assertIn(str(mismatched.pk), out.getvalue())
+
+
+class BookListApiTests(TestCase):
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', description='Desert planet epic.',
+                                        embedding=pack_embedding(np.ones(384)))
+        self.client = APIClient()
+
+    def test_list_is_lean_and_never_selects_embeddings(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]),
+                         {'id', 'title', 'author', 'location', 'section', 'category_name', 'available'})
+        self.assertNotIn('embedding', queries[0]['sql'])
+        self.assertNotIn('description', queries[0]['sql'])
+
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response.data['description'], 'Desert planet epic.')
+        self.assertNotIn('embedding', response.data)
+
+    def test_sparse_fieldset(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/books/?fields=id,title,description')
+        self.assertEqual(response.data['results'],
+                         [{'id': self.book.pk, 'title': 'Dune', 'description': 'Desert planet epic.'}])
+        self.assertNotIn('author', queries[0]['sql'])
+
+        response = self.client.get('/api/books/?fields=title,embedding')
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_of_deferred_instance_still_queues_embedding(self):
+        PendingEmbedding.objects.all().delete()
+        self.client.force_authenticate(User.objects.create_user(username='librarian', password='pass12345'))
+        response = self.client.patch(f'/api/books/{self.book.pk}/', {'description': 'Spice and politics.'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(PendingEmbedding.objects.filter(book_id=self.book.pk).exists())
+        self.assertIsNotNone(Book.objects.get(pk=self.book.pk).embedding)
+
+
+class PaginationTests(TestCase):
+
+    def collect(self, client, url):
+        items, pages = [], 0
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            items.extend(response.data['results'])
+            url, pages = response.data['next'], pages + 1
+        return items, pages
+
+    def test_book_list_walks_every_book_once_by_cursor(self):
+        Book.objects.bulk_create([Book(title=f'Book {i}') for i in range(25)])
+        client = APIClient()
+        items, pages = self.collect(client, '/api/books/?page_size=10')
+        self.assertEqual(pages, 3)
+        self.assertEqual([item['id'] for item in items], sorted(Book.objects.values_list('id', flat=True)))
+
+        # Deep pages are a keyset query, not an OFFSET.
+        page = client.get('/api/books/?page_size=10').data
+        with CaptureQueriesContext(connection) as queries:
+            client.get(page['next'])
+        self.assertIn('"id" >', queries[0]['sql'])
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+        self.assertEqual(len(client.get('/api/books/?page_size=1000').data['results']), 25)
+        Book.objects.bulk_create([Book(title=f'More {i}') for i in range(100)])
+        self.assertEqual(len(client.get('/api/books/?page_size=1000').data['results']), 100)
+
+    def test_admin_lists_are_paginated_newest_first(self):
+        admin = User.objects.create_superuser(username='admin', password='pass12345')
+        student = User.objects.create_user(username='student', password='pass12345')
+        books = Book.objects.bulk_create([Book(title=f'Book {i}') for i in range(3)])
+        requests = [BookRequest.objects.create(book=book, user=student) for book in books]
+        client = APIClient()
+        client.force_authenticate(admin)
+        items, pages = self.collect(client, '/api/admin-dashboard/pending_requests/?page_size=2')
+        self.assertEqual(pages, 2)
+        self.assertEqual([item['id'] for item in items], [r.id for r in reversed(requests)])
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Admin and profile endpoints must run a fixed number of queries however
+    many rows they return. Each endpoint is checked with a small and a
+    larger seed against the same budget.
+    """
+    BUDGETS = {
+        '/api/admin-dashboard/overdue_books/': 1,
+        '/api/admin-dashboard/raised_queries/': 1,
+        '/api/admin-dashboard/pending_requests/': 1,
+        '/api/profile/me/': 3,  # profile + borrowed books + requested books
+        '/api/books/': 1,
+    }
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass12345')
+        StudentProfile.objects.create(user=self.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def seed(self, n):
+        students = [User.objects.create_user(username=f'student{len(User.objects.all())}') for _ in range(n)]
+        books = Book.objects.bulk_create([Book(title=f'Book {i}', available=False) for i in range(n)])
+        for student, book in zip(students, books):
+            for user in (student, self.admin):
+                BookBorrow.objects.create(book=book, user=user, due_date='2000-01-01')
+                BookRequest.objects.create(book=book, user=user)
+            StudentQuery.objects.create(user=student, query_text='Where is the library?')
+
+    def test_endpoints_stay_within_query_budget(self):
+        for rows in (2, 20):
+            self.seed(rows)
+            for url, budget in self.BUDGETS.items():
+                with self.subTest(url=url, rows=rows), self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+
+class FullTextSearchTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.crash = Book.objects.create(title='Python Crash Course', author='Eric Matthes')
+        self.fluent = Book.objects.create(title='Fluent Python', author='Luciano Ramalho')
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert')
+
+    def search(self, text, **params):
+        response = self.client.get('/api/books/', {'search': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_uses_index_and_ranks_by_relevance(self):
+        with CaptureQueriesContext(connection) as queries:
+            found = self.search('python crash')
+        self.assertEqual(found, [self.crash.pk])
+        self.assertIn('books_book_fts', queries[0]['sql'])
+        self.assertNotIn('LIKE', queries[0]['sql'])
+
+        self.assertEqual(set(self.search('pyth')), {self.crash.pk, self.fluent.pk})  # prefix match
+        self.assertEqual(self.search('herbert'), [self.dune.pk])
+
+        ranked = Book.objects.create(title='Python Python Python')
+        self.assertEqual(self.search('python')[0], ranked.pk)
+
+    def test_index_follows_book_writes(self):
+        self.dune.title = 'Children of Dune'
+        self.dune.save()
+        self.assertEqual(self.search('children'), [self.dune.pk])
+        self.dune.delete()
+        self.assertEqual(self.search('dune'), [])
+
+    def test_results_page_by_relevance(self):
+        Book.objects.bulk_create([Book(title=f'Python volume {i}') for i in range(5)])
+        expected = self.search('python', page_size=100)
+        url, found = '/api/books/?search=python&page_size=2', []
+        while url:
+            page = self.client.get(url).data
+            found += [item['id'] for item in page['results']]
+            url = page['next']
+        self.assertEqual(found, expected)
+
+    def test_broad_queries_rank_their_newest_matches_and_return_all(self):
+        books = Book.objects.bulk_create([Book(title=f'Python volume {i}') for i in range(5)])
+        newest = [book.pk for book in books[-3:]]
+        everything = {self.crash.pk, self.fluent.pk} | {book.pk for book in books}
+        with mock.patch('books.search.MAX_RANKED_MATCHES', 3):
+            self.assertEqual(search_books(Book.objects.all(), 'python').count(), 7)
+            url, found = '/api/books/?search=python&page_size=2', []
+            while url:
+                page = self.client.get(url).data
+                found += [item['id'] for item in page['results']]
+                url = page['next']
+        self.assertEqual(len(found), 7)
+        self.assertEqual(set(found), everything)
+        self.assertEqual(set(found[:3]), set(newest))
+        self.assertEqual(found[3:], sorted(everything - set(newest)))
+
+    def test_mysql_query_leaves_out_unindexed_words(self):
+        self.assertEqual(_mysql_query(search_terms('The Hobbit')), '+hobbit*')
+        self.assertEqual(_mysql_query(search_terms('C programming in Go')), '+programming*')
+        self.assertEqual(_mysql_query(search_terms('of the')), '')
+
+        with mock.patch('books.search.connection') as mysql:
+            mysql.vendor = 'mysql'
+            matched = str(search_books(Book.objects.all(), 'the hobbit').query)
+            nothing_indexable = str(search_books(Book.objects.all(), 'of the').query)
+        self.assertIn("AGAINST (+hobbit* IN BOOLEAN MODE)", matched)
+        self.assertIn('LIKE', nothing_indexable)
+        self.assertNotIn('AGAINST', nothing_indexable)
+
+
+class SuggestIndexTests(TestCase):
+
+    def setUp(self):
+        self.potter = Book.objects.create(title="Harry Potter and the Philosopher's Stone", author='J. K. Rowling')
+        self.rings = Book.objects.create(title='The Lord of the Rings', author='J. R. R. Tolkien')
+        self.hobbit = Book.objects.create(title='The Hobbit', author='J. R. R. Tolkien')
+        self.addCleanup(setattr, SUGGEST_INDEX, '_data', None)
+        SUGGEST_INDEX.build()
+
+    def ids(self, query):
+        return [item['id'] for item in SUGGEST_INDEX.suggest(query)]
+
+    def test_prefixes_and_typos(self):
+        self.assertEqual(self.ids('harr'), [self.potter.pk])
+        self.assertEqual(self.ids('hary poter'), [self.potter.pk])
+        self.assertEqual(set(self.ids('tolkein')), {self.rings.pk, self.hobbit.pk})
+        self.assertEqual(self.ids('lord ring'), [self.rings.pk])
+        self.assertEqual(self.ids('zzzz'), [])
+
+    def test_follows_book_writes(self):
+        dune = Book.objects.create(title='Dune', author='Frank Herbert')
+        self.assertEqual(self.ids('dun'), [dune.pk])
+        dune.title = 'Children of Dune'
+        dune.save()
+        self.assertEqual(self.ids('childr'), [dune.pk])
+        dune.delete()
+        self.assertEqual(self.ids('dune'), [])
+        self.assertNotIn('dune', SUGGEST_INDEX._data.postings)
+
+    def test_endpoint_and_stats(self):
+        response = APIClient().get('/api/books/suggest/', {'q': 'hobit', 'limit': 1})
+        self.assertEqual(response.data['results'],
+                         [{'id': self.hobbit.pk, 'title': 'The Hobbit', 'author': 'J. R. R. Tolkien'}])
+        stats = SUGGEST_INDEX.stats()
+        self.assertEqual(stats['books'], 3)
+        self.assertGreater(stats['memory_bytes'], 0)
+
+    @skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_forked_child_starts_over_a_build_running_in_the_parent(self):
+        building = SuggestIndex()
+        building._build_lock.acquire()  # as if a warm-up thread were building
+        building._pending = []
+        self.addCleanup(building._build_lock.release)
+
+        pid = os.fork()
+        if not pid:
+            ok = (not building._build_lock.locked() and building._pending is None
+                  and SUGGEST_INDEX._data is not None)  # a finished copy is kept
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+
+class SemanticSearchTests(TestCase):
+
+    def setUp(self):
+        # Book i is stored as the unit vector e_i; queries encode to whatever
+        # self.query_vector is set to.
+        specs = [
+            ('Python Crash Course', 'Programming', True),
+            ('Fluent Python', 'Programming', False),
+            ('Dune', 'Fiction', True),
+            ('Learning Python', 'Programming', True),
+            ('The Hobbit', 'Fiction', True),
+        ]
+        self.books = [Book.objects.create(title=title, section=Section.objects.get_or_create(name=section)[0],
+                                          available=available)
+                      for title, section, available in specs]
+        self.index = faiss.IndexIDMap(faiss.IndexFlatL2(8))
+        self.index.add_with_ids(np.eye(8, dtype='float32')[:len(self.books)],
+                                np.array([book.pk for book in self.books], dtype='int64'))
+        self.query_vector = np.eye(8, dtype='float32')[1]
+        self.model = mock.Mock()
+        self.model.encode.side_effect = lambda texts: np.array([self.query_vector] * len(texts))
+        for target, value in (('get_model', lambda: self.model), ('INDEX_MANAGER.get', lambda: self.index)):
+            patcher = mock.patch(f'books.views.{target}', side_effect=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        views.CHAT_CACHE.embeddings.clear()
+        self.client = APIClient()
+
+    def search(self, q, **params):
+        response = self.client.get('/api/books/semantic-search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def ids(self, data):
+        return [item['id'] for item in data['results']]
+
+    def test_filters_are_applied_inside_the_vector_search(self):
+        crash, fluent, dune, learning, hobbit = self.books
+        # The nearest vector is Fluent Python, which is out on loan: k
+        # results must still come back, all of them available.
+        found = self.ids(self.search('zzz', k=3, available='true'))
+        self.assertEqual(len(found), 3)
+        self.assertNotIn(fluent.pk, found)
+        self.assertEqual(set(self.ids(self.search('zzz', k=3, section='Fiction'))), {dune.pk, hobbit.pk})
+        self.assertEqual(self.ids(self.search('zzz', k=3, available='false')), [fluent.pk])
+        self.assertEqual(self.ids(self.search('zzz', section='poetry')), [])
+
+    def test_fuses_vector_and_lexical_ranks(self):
+        crash, fluent, dune, learning, hobbit = self.books
+        # Learning Python is the nearest vector and a text match, The Hobbit
+        # only the second nearest vector.
+        self.query_vector = np.eye(8, dtype='float32')[3] + 0.5 * np.eye(8, dtype='float32')[4]
+        data = self.search('python', k=5)
+        self.assertTrue(data['semantic'])
+        results = {item['id']: item for item in data['results']}
+        self.assertEqual(data['results'][0]['id'], learning.pk)
+        self.assertIsNotNone(results[learning.pk]['lexical_score'])
+        self.assertIsNotNone(results[learning.pk]['vector_distance'])
+        self.assertIsNone(results[hobbit.pk]['lexical_score'])
+        self.assertGreater(results[crash.pk]['score'], results[hobbit.pk]['score'])
+        scores = [item['score'] for item in data['results']]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertNotIn('description', data['results'][0])
+
+    def test_offset_pages_through_the_same_ranking(self):
+        everything = self.ids(self.search('python', k=5))
+        first = self.search('python', k=2)
+        second = self.search('python', k=2, offset=first['next_offset'])
+        self.assertEqual(first['next_offset'], 2)
+        self.assertEqual(self.ids(first) + self.ids(second), everything[:4])
+
+    def test_full_text_only_without_model(self):
+        self.model = None
+        data = self.search('python')
+        self.assertFalse(data['semantic'])
+        self.assertEqual(set(self.ids(data)), {self.books[0].pk, self.books[1].pk, self.books[3].pk})
+        self.assertTrue(all(item['vector_distance'] is None for item in data['results']))
+
+    def test_bad_parameters(self):
+        for params in ({}, {'q': 'python', 'k': 'many'}, {'q': 'python', 'available': 'maybe'}):
+            response = self.client.get('/api/books/semantic-search/', params)
+            self.assertEqual(response.status_code, 400)
+
+
+class SimilarBooksTests(TestCase):
+
+    def setUp(self):
+        # Books on a line at these positions; neighbours are unambiguous.
+        self.positions = {'A': 0, 'B': 1, 'C': 3, 'D': 7, 'E': 15}
+        self.books = {name: Book.objects.create(title=name) for name in self.positions}
+        self.index = faiss.IndexIDMap(faiss.IndexFlatL2(4))
+        for name, position in self.positions.items():
+            self.place(name, position)
+        patcher = mock.patch('books.views.INDEX_MANAGER.get', side_effect=lambda: self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def place(self, name, position):
+        book_id = np.array([self.books[name].pk], dtype='int64')
+        self.index.remove_ids(book_id)
+        self.index.add_with_ids(np.array([[position, 0, 0, 0]], dtype='float32'), book_id)
+
+    def stored(self):
+        names = {book.pk: name for name, book in self.books.items()}
+        lists = {}
+        for row in SimilarBook.objects.order_by('book_id', 'rank'):
+            lists.setdefault(names[row.book_id], []).append(names.get(row.similar_id))
+        return lists
+
+    def test_endpoint_is_a_single_lookup(self):
+        self.assertEqual(compute_all(self.index, count=2), 5)
+        self.assertEqual(self.stored(), {'A': ['B', 'C'], 'B': ['A', 'C'], 'C': ['B', 'A'],
+                                         'D': ['C', 'B'], 'E': ['D', 'C']})
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/books/{self.books['C'].pk}/similar/")
+        self.assertTrue(response.data['precomputed'])
+        self.assertEqual([(item['title'], item['distance']) for item in response.data['results']],
+                         [('B', 4.0), ('A', 9.0)])
+        response = self.client.get(f"/api/books/{self.books['C'].pk}/similar/", {'limit': 1})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_books_without_a_list_are_searched_live(self):
+        response = self.client.get(f"/api/books/{self.books['D'].pk}/similar/", {'limit': 2})
+        self.assertFalse(response.data['precomputed'])
+        self.assertEqual([item['title'] for item in response.data['results']], ['C', 'B'])
+        self.assertEqual(self.client.get('/api/books/999999/similar/').status_code, 404)
+        self.assertEqual(self.client.get('/api/books/abc/similar/').status_code, 404)
+
+    def test_lists_are_searched_with_the_api_accuracy_knobs(self):
+        index = faiss.index_factory(4, 'IVF2,Flat')
+        index.train(np.array([[position, 0, 0, 0] for position in self.positions.values()], dtype='float32'))
+        index.add_with_ids(np.array([[position, 0, 0, 0] for position in self.positions.values()], dtype='float32'),
+                           np.array([book.pk for book in self.books.values()], dtype='int64'))
+        with self.settings(FAISS_NPROBE=2):
+            refresh_similar_books(index, [self.books['A'].pk], count=2)
+        self.assertEqual(faiss.extract_index_ivf(index).nprobe, 2)
+        self.assertEqual(self.stored()['A'], ['B', 'C'])
+
+    def test_refresh_follows_moved_and_deleted_books(self):
+        compute_all(self.index, count=2)
+        # E moves in between B and C: its own list, and those it now belongs in, change.
+        self.place('E', 2.5)
+        refresh_similar_books(self.index, [self.books['E'].pk], count=2)
+        lists = self.stored()
+        self.assertEqual(lists['E'], ['C', 'B'])
+        self.assertEqual(lists['B'], ['A', 'E'])
+        self.assertEqual(lists['C'], ['E', 'B'])
+
+        # Every list that had B in it is recomputed without it.
+        deleted = self.books['B'].pk
+        self.index.remove_ids(np.array([deleted], dtype='int64'))
+        self.books['B'].delete()
+        refresh_similar_books(self.index, [deleted], count=2)
+        lists = self.stored()
+        self.assertNotIn('B', lists)
+        for name, neighbours in lists.items():
+            self.assertNotIn('B', neighbours, name)
+            self.assertEqual(len(neighbours), 2, name)
+
+
+class RecommenderTests(TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        patcher = mock.patch('books.management.commands.train_recommender.MODEL_FILE_PATH',
+                             os.path.join(tmpdir, 'recommender.model'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Two groups of readers: science fiction (books 0-3) and history (books 4-7).
+        self.books = [Book.objects.create(title=f'Book {i}') for i in range(8)]
+        self.users = {name: User.objects.create_user(name) for name in ('sf1', 'sf2', 'sf3', 'sf4', 'h1', 'h2', 'h3', 'new')}
+        history = {
+            'sf1': [0, 1, 2], 'sf2': [0, 1, 3], 'sf3': [1, 2, 3], 'sf4': [0, 2],
+            'h1': [4, 5, 6], 'h2': [4, 5, 7], 'h3': [5, 6, 7],
+        }
+        for name, books in history.items():
+            for i in books:
+                self.borrow(name, i)
+        BookRequest.objects.create(user=self.users['sf4'], book=self.books[1])
+
+    def borrow(self, name, i):
+        BookBorrow.objects.create(user=self.users[name], book=self.books[i], due_date='2030-01-01')
+
+    def stored(self, name):
+        return [self.books.index(row.book) for row in
+                RecommendedBook.objects.filter(user=self.users[name]).select_related('book').order_by('rank')]
+
+    def train(self, *args):
+        call_command('train_recommender', '--count', '2', '--factors', '4', '--epochs', '50', *args, stdout=StringIO())
+
+    def test_recommends_unseen_books_of_the_same_taste(self):
+        self.train()
+        # The one book of their group each reader hasn't borrowed (or requested) comes first.
+        self.assertEqual(self.stored('sf1')[0], 3)
+        self.assertEqual(self.stored('sf4')[0], 3)
+        self.assertEqual(self.stored('h1')[0], 7)
+        self.assertFalse(set(self.stored('sf4')) & {0, 1, 2})
+        self.assertEqual(len(self.stored('new')), 2)  # most borrowed books, no history needed
+
+        client = APIClient()
+        client.force_authenticate(self.users['sf1'])
+        with self.assertNumQueries(1):
+            response = client.get('/api/profile/recommendations/')
+        self.assertEqual(response.data['results'][0]['id'], self.books[3].pk)
+        self.assertIsNotNone(response.data['results'][0]['score'])
+
+    def test_refresh_only_recomputes_users_with_new_activity(self):
+        self.train()
+        before = dict(RecommendedBook.objects.values_list('id', 'user_id'))
+        self.borrow('sf1', 3)
+
+        self.train('--refresh')
+        self.assertNotIn(3, self.stored('sf1'))
+        after = dict(RecommendedBook.objects.values_list('id', 'user_id'))
+        rewritten = {user_id for row_id, user_id in after.items() if row_id not in before}
+        self.assertEqual(rewritten, {self.users['sf1'].pk})
+
+
+class CirculationTests(TestCase):
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Dune')
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_second_rent_conflicts(self):
+        response = self.client_for(self.alice).post(f'/api/books/{self.book.pk}/rent/', {'due_date': '2030-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Dune', response.data['message'])
+        response = self.client_for(self.bob).post(f'/api/books/{self.book.pk}/rent/', {'due_date': '2030-01-01'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(list(BookBorrow.objects.values_list('user__username', flat=True)), ['alice'])
+        self.assertFalse(Book.objects.get(pk=self.book.pk).available)
+
+    def test_rent_validates_input(self):
+        client = self.client_for(self.alice)
+        self.assertEqual(client.post('/api/books/999999/rent/', {'due_date': '2030-01-01'}).status_code, 404)
+        self.assertEqual(client.post(f'/api/books/{self.book.pk}/rent/', {'due_date': 'soon'}).status_code, 400)
+        self.assertEqual(client.post(f'/api/books/{self.book.pk}/rent/', {}).status_code, 400)
+        self.assertTrue(Book.objects.get(pk=self.book.pk).available)
+
+    def test_non_numeric_book_id_is_not_found(self):
+        client = self.client_for(self.alice)
+        for pk in ('abc', '1e3', str(2 ** 64)):
+            response = client.post(f'/api/books/{pk}/rent/', {'due_date': '2030-01-01'})
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.data, {'error': 'Book not found.'})
+            self.assertEqual(client.post(f'/api/books/{pk}/return/').status_code, 404)
+
+    def test_only_the_borrower_or_staff_can_return(self):
+        self.client_for(self.alice).post(f'/api/books/{self.book.pk}/rent/', {'due_date': '2030-01-01'})
+        self.assertEqual(self.client_for(self.bob).post(f'/api/books/{self.book.pk}/return/').status_code, 409)
+
+        response = self.client_for(self.alice).post(f'/api/books/{self.book.pk}/return/')
+        self.assertEqual(response.status_code, 200)
+        borrow = BookBorrow.objects.get()
+        self.assertEqual(borrow.status, 'RETURNED')
+        self.assertIsNotNone(borrow.returned_date)
+        self.assertTrue(Book.objects.get(pk=self.book.pk).available)
+        self.assertEqual(self.client_for(self.alice).post(f'/api/books/{self.book.pk}/return/').status_code, 409)
+
+        self.client_for(self.bob).post(f'/api/books/{self.book.pk}/rent/', {'due_date': '2030-01-01'})
+        staff = User.objects.create_user('librarian', is_staff=True)
+        self.assertEqual(self.client_for(staff).post(f'/api/books/{self.book.pk}/return/').status_code, 200)
+        self.assertTrue(Book.objects.get(pk=self.book.pk).available)
+
+    def batch(self, user, kind, **data):
+        return self.client_for(user).post(f'/api/books/batch-{kind}/', data, format='json')
+
+    def test_batch_rent_reports_each_book(self):
+        taken = Book.objects.create(title='Emma', available=False)
+        free = Book.objects.create(title='Ulysses')
+        response = self.batch(self.alice, 'rent', book_ids=[self.book.pk, taken.pk, 999999, free.pk, self.book.pk],
+                              due_date='2030-01-01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['succeeded'], 2)
+        self.assertEqual([(item['book_id'], item['result']) for item in response.data['results']], [
+            (self.book.pk, 'done'), (taken.pk, 'unavailable'), (999999, 'not_found'), (free.pk, 'done'),
+        ])
+        self.assertEqual(set(BookBorrow.objects.values_list('book_id', flat=True)), {self.book.pk, free.pk})
+        self.assertEqual(Book.objects.filter(available=True).count(), 0)
+
+        response = self.batch(self.alice, 'return', book_ids=[self.book.pk, taken.pk, free.pk])
+        self.assertEqual([item['result'] for item in response.data['results']], ['done', 'not_borrowed', 'done'])
+        self.assertEqual(BookBorrow.objects.filter(status='RETURNED').count(), 2)
+        self.assertTrue(Book.objects.get(pk=free.pk).available)
+
+    def test_batch_statements_dont_grow_with_the_stack(self):
+        def statements(kind, book_ids, **data):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.batch(self.alice, kind, book_ids=book_ids, **data).status_code, 200)
+            return len(queries)
+
+        small = [book.pk for book in Book.objects.bulk_create([Book(title=f'S{i}') for i in range(2)])]
+        large = [book.pk for book in Book.objects.bulk_create([Book(title=f'L{i}') for i in range(40)])]
+        self.assertEqual(statements('rent', small, due_date='2030-01-01'),
+                         statements('rent', large, due_date='2030-01-01'))
+        self.assertEqual(statements('return', small), statements('return', large))
+
+    def test_only_staff_batch_for_someone_else(self):
+        response = self.batch(self.bob, 'rent', book_ids=[self.book.pk], due_date='2030-01-01', username='alice')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.batch(self.bob, 'rent', book_ids=[], due_date='2030-01-01').status_code, 400)
+        for kind in ('rent', 'return'):
+            response = self.batch(self.bob, kind, book_ids=[self.book.pk, 2 ** 63], due_date='2030-01-01')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('book_ids', response.data)
+
+        staff = User.objects.create_user('librarian', is_staff=True)
+        response = self.batch(staff, 'rent', book_ids=[self.book.pk], due_date='2030-01-01', username='alice')
+        self.assertEqual(response.data['succeeded'], 1)
+        self.assertEqual(BookBorrow.objects.get().user, self.alice)
+        self.assertEqual(self.batch(staff, 'rent', book_ids=[self.book.pk], due_date='2030-01-01',
+                                    username='nobody').status_code, 400)
+        self.assertEqual(self.batch(staff, 'return', book_ids=[self.book.pk]).data['succeeded'], 1)
+
+
+class RequestModerationTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user('librarian', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        student = User.objects.create_user('student')
+        self.books = [Book.objects.create(title=f'Book {i}', available=False) for i in range(4)]
+        self.requests = [BookRequest.objects.create(user=student, book=book) for book in self.books]
+        PendingEmbedding.objects.all().delete()
+
+    def bulk(self, request_ids, new_status):
+        return self.client.post('/api/admin-dashboard/bulk-update-request-status/',
+                                {'request_ids': request_ids, 'status': new_status}, format='json')
+
+    def test_bulk_approve_reports_each_request(self):
+        self.requests[1].status = 'REJECTED'
+        self.requests[1].save()
+        ids = [self.requests[0].pk, self.requests[1].pk, 999999, self.requests[2].pk]
+        response = self.bulk(ids, 'APPROVED')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['succeeded'], 2)
+        self.assertEqual([item['result'] for item in response.data['results']],
+                         ['done', 'not_pending', 'not_found', 'done'])
+        self.assertEqual(list(BookRequest.objects.order_by('pk').values_list('status', flat=True)),
+                         ['APPROVED', 'REJECTED', 'APPROVED', 'PENDING'])
+        self.assertEqual(list(Book.objects.order_by('pk').values_list('available', flat=True)),
+                         [True, False, True, False])
+        self.assertFalse(PendingEmbedding.objects.exists())
+
+        response = self.bulk([self.requests[3].pk], 'REJECTED')
+        self.assertEqual(response.data['succeeded'], 1)
+        self.assertFalse(Book.objects.get(pk=self.books[3].pk).available)
+        self.assertEqual(self.bulk([self.requests[0].pk], 'DELETED').status_code, 400)
+
+    def test_statements_dont_grow_with_the_batch(self):
+        def statements(request_ids):
+            with CaptureQueriesContext(connection) as queries:
+                self.bulk(request_ids, 'APPROVED')
+            return len(queries)
+
+        self.assertEqual(statements([self.requests[0].pk]), statements([r.pk for r in self.requests[1:]]))
+
+    def test_oversized_request_id_is_rejected(self):
+        response = self.bulk([self.requests[0].pk, 2 ** 63], 'APPROVED')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('request_ids', response.data)
+        self.assertEqual(BookRequest.objects.get(pk=self.requests[0].pk).status, 'PENDING')
+
+    def test_single_update_of_missing_request_is_404(self):
+        response = self.client.post('/api/admin-dashboard/0/update-request-status/999999/', {'status': 'APPROVED'})
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertNotIn('FULL SCAN', out.getvalue())
+
+    def test_full_scan_is_detected(self):
+        tables, _ = full_scans(Book.objects.filter(title='Dune'))
+        self.assertEqual(tables, ['books_book'])
+
+
+class CategorySectionTests(TestCase):
+
+    def setUp(self):
+        self.fiction = Category.objects.create(name='Fiction')
+        self.science = Category.objects.create(name='Science')
+        Category.objects.create(name='Poetry')
+        shelf = Section.objects.create(name='Section-A')
+        Book.objects.create(title='Dune', category=self.fiction, section=shelf)
+        Book.objects.create(title='Emma', category=self.fiction)
+        Book.objects.create(title='Cosmos', category=self.science, section=shelf)
+        self.client = APIClient()
+
+    def test_category_list_counts_books_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/categories/')
+        self.assertEqual([(c['name'], c['book_count']) for c in response.data],
+                         [('Fiction', 2), ('Poetry', 0), ('Science', 1)])
+        self.assertEqual([(s['name'], s['book_count']) for s in self.client.get('/api/sections/').data],
+                         [('Section-A', 2)])
+
+    def test_filters_match_names_exactly(self):
+        def titles(query):
+            with self.assertNumQueries(1):
+                response = self.client.get(f'/api/books/?{query}')
+            return sorted(book['title'] for book in response.data['results'])
+
+        self.assertEqual(titles('category=Fiction'), ['Dune', 'Emma'])
+        self.assertEqual(titles('category=Fict'), [])
+        self.assertEqual(titles('section=Section-A&category=Science'), ['Cosmos'])
+        book = self.client.get('/api/books/?category=Science').data['results'][0]
+        self.assertEqual((book['category_name'], book['section']), ('Science', 'Section-A'))
+
+    def test_books_are_written_by_category_and_section_name(self):
+        self.client.force_authenticate(User.objects.create_user('librarian'))
+        response = self.client.post('/api/books/', {'title': 'Odes', 'category_name': 'Poetry ',
+                                                    'section': 'Section-B'})
+        self.assertEqual(response.status_code, 201, response.data)
+        book = Book.objects.get(title='Odes')
+        self.assertEqual((book.category.name, book.section.name), ('Poetry', 'Section-B'))
+        response = self.client.patch(f'/api/books/{book.pk}/', {'section': ''})
+        self.assertIsNone(response.data['section'])
+
+        response = self.client.patch(f'/api/books/{book.pk}/', {'category_name': 'poetry', 'section': 'S' * 255})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['category_name'], 'Poetry')
+        self.assertEqual(Book.objects.get(pk=book.pk).section.name, 'S' * 255)
+
+    def test_invalid_book_creates_no_category_or_section(self):
+        self.client.force_authenticate(User.objects.create_user('librarian'))
+        response = self.client.post('/api/books/', {'category_name': 'Drama', 'section': 'Section-C'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Category.objects.filter(name='Drama').exists())
+        self.assertFalse(Section.objects.filter(name='Section-C').exists())
+
+
+class CheckoutContentionTests(TransactionTestCase):
+    """Threads racing for one book: every round must have exactly one winner."""
+
+    def test_one_winner_per_round(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Shared-cache in-memory SQLite fails concurrent writers with
+            # "table is locked" instead of making them wait.
+            self.skipTest('needs a file-backed or server database')
+        book = Book.objects.create(title='Dune')
+        users = [User.objects.create_user(f'reader{i}') for i in range(4)]
+        stats = contend(book.pk, users, rounds=10, due_date='2030-01-01')
+        self.assertEqual(stats['errors'], [])
+        self.assertEqual(stats['bad_rounds'], 0)
+        self.assertEqual(BookBorrow.objects.filter(book=book, status='RETURNED').count(), 10)
+        self.assertTrue(Book.objects.get(pk=book.pk).available)
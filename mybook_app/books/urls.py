@@ -4,6 +4,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     AuthViewSet,
     CategoryViewSet,
+    SectionViewSet,
     BookViewSet,
     AdminDashboardViewSet,
     ProfileViewSet
@@ -13,6 +14,7 @@ from .views import (
 router = DefaultRouter()
 router.register(r'auth', AuthViewSet, basename='auth')
 router.register(r'categories', CategoryViewSet, basename='category')
+router.register(r'sections', SectionViewSet, basename='section')
 router.register(r'books', BookViewSet, basename='book')
 router.register(r'admin-dashboard', AdminDashboardViewSet, basename='admin-dashboard')
 
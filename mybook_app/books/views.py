@@ -1,56 +1,109 @@
 # books/views.py
 import logging
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.db import IntegrityError
-from django.db.models import Q
 from django.db import models  # <-- ADDED THIS IMPORT
 from django.utils import timezone
-from rest_framework import viewsets, status, permissions
+from rest_framework import serializers, viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 
-#AI Imports
+#AI Imports (the heavy libraries are loaded lazily inside these modules)
 import os
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
-
-from .models import Book, Category, BookBorrow, StudentQuery, StudentProfile,BookRequest
+from . import circulation
+from .chat_batcher import ChatBatcher
+from .embeddings import get_model
+from .index_manager import IndexManager
+from .indexing import INDEX_FILE_PATH
+from .query_cache import ChatCache
+
+from .hybrid_search import filter_books, hybrid_search
+from .models import Book, Category, Section, BookBorrow, StudentQuery, StudentProfile,BookRequest, RecommendedBook, SimilarBook
+from .pagination import AdminListPagination, BookCursorPagination
+from .search import search_books
+from .similar import index_vector, nearest
+from .suggest_index import SUGGEST_INDEX
 from .serializers import (
     UserSerializer,
     CategorySerializer,
+    SectionSerializer,
     BookSerializer,
+    BookListSerializer,
     OverdueBookSerializer,
     StudentQuerySerializer,
     StudentProfileSerializer,
-    BookRequestSerializer
+    BookRequestSerializer,
+    BatchRentSerializer,
+    BatchReturnSerializer,
+    BulkRequestStatusSerializer,
+    book_columns,
 )
 
 logger = logging.getLogger(__name__)
 
 # --- AI MODEL AND INDEX LOADING ---
-MODEL_NAME = 'all-MiniLM-L6-v2'
-INDEX_FILE_PATH = 'book_index.faiss'
+# The model is the process-wide instance from books.embeddings. The index is
+# owned by the manager, which picks up new versions published by the index
+# worker / generate_embeddings without a restart.
+INDEX_MANAGER = IndexManager(
+    INDEX_FILE_PATH,
+    search_params={'nprobe': settings.FAISS_NPROBE, 'efSearch': settings.FAISS_EF_SEARCH},
+)
+
+# Concurrent chat queries are encoded and searched together, see chat_batcher.py.
+# Repeated questions are served from CHAT_CACHE, which is keyed on the index
+# generation so a reload invalidates old results automatically.
+CHAT_CACHE = ChatCache(
+    max_embeddings=settings.CHAT_CACHE_SIZE,
+    max_results=settings.CHAT_CACHE_SIZE,
+)
+CHAT_BATCHER = ChatBatcher(
+    get_model,
+    INDEX_MANAGER.get,
+    max_batch_size=settings.CHAT_BATCH_MAX_SIZE,
+    max_wait=settings.CHAT_BATCH_WINDOW_MS / 1000,
+    cache=CHAT_CACHE,
+    get_version=lambda: INDEX_MANAGER.generation,
+)
+
+if not os.path.exists(INDEX_FILE_PATH):
+    logger.error(f"FAISS index file not found at: {INDEX_FILE_PATH}")
+
+
+def query_embedding(model, text):
+    """Embedding of a search query, shared with the chat's embedding cache."""
+    vector = CHAT_CACHE.get_embedding(text)
+    if vector is None:
+        vector = model.encode([text])[0]
+        CHAT_CACHE.put_embedding(text, vector)
+    return vector
 
-MODEL = None
-INDEX = None
 
-try:
-    logger.info("Loading SentenceTransformer model...")
-    MODEL = SentenceTransformer(MODEL_NAME)
-    logger.info("Model loaded successfully.")
+def int_param(params, name, default, lowest, highest):
+    """Integer query parameter clamped to [lowest, highest]; 400 if not a number."""
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: 'Must be a number.'})
+    return min(max(value, lowest), highest)
 
-    if os.path.exists(INDEX_FILE_PATH):
-        logger.info("Loading FAISS index...")
-        INDEX = faiss.read_index(INDEX_FILE_PATH)
-        logger.info("FAISS index loaded successfully.")
-    else:
-        logger.error(f"FAISS index file not found at: {INDEX_FILE_PATH}")
 
-except Exception as e:
-    logger.error(f"Error loading AI model or index: {e}")
+def book_id(pk):
+    """The book ID from the URL as an int; 404 if it isn't one (or too big for the column)."""
+    try:
+        value = int(pk)
+    except (TypeError, ValueError):
+        value = None
+    if value is None or not 0 < value < 2 ** 63:
+        raise NotFound({'error': 'Book not found.'})
+    return value
+
+
+BOOLEAN_PARAMS = {'true': True, '1': True, 'false': False, '0': False}
 
 
 # --- AuthViewSet ---
@@ -111,48 +164,160 @@ class AuthViewSet(viewsets.ViewSet):
 
 # --- CategoryViewSet ---
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+    # Book counts for every category in one LEFT JOIN ... GROUP BY query.
+    queryset = Category.objects.annotate(book_count=models.Count('books')).order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
+# --- SectionViewSet ---
+class SectionViewSet(CategoryViewSet):
+    queryset = Section.objects.annotate(book_count=models.Count('books')).order_by('name')
+    serializer_class = SectionSerializer
+
+
 
 # --- BookViewSet ---
 class BookViewSet(viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = BookCursorPagination
+
+    def requested_fields(self):
+        """
+        The `?fields=id,title,...` sparse fieldset for list/retrieve, or None.
+        Any of BookSerializer's fields may be asked for.
+        """
+        fields = self.request.query_params.get('fields') if self.action in ('list', 'retrieve') else None
+        if not fields:
+            return None
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in BookSerializer.Meta.fields]
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}."})
+        return fields
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.requested_fields() is None:
+            return BookListSerializer
+        return BookSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
-        queryset = Book.objects.all()
+        # Only SELECT the columns the response needs: never the packed
+        # embedding, and no description for the card list.
+        fields = self.requested_fields()
+        if fields is None and self.action == 'list':
+            fields = BookListSerializer.Meta.fields
+        if fields is not None:
+            related, columns = book_columns(['id', *fields])
+            queryset = Book.objects.select_related(*related).only(*columns)
+        else:
+            queryset = Book.objects.select_related('category', 'section').defer('embedding', 'description_hash')
         category = self.request.query_params.get('category')
         section = self.request.query_params.get('section')
         search_query = self.request.query_params.get('search')
+        # Exact names: a unique-index lookup on Category/Section plus the
+        # indexed FK on books_book, instead of a LIKE '%...%' scan.
         if category:
-            queryset = queryset.filter(category_name__icontains=category)
+            queryset = queryset.filter(category__name=category)
         if section:
-            queryset = queryset.filter(section__icontains=section)
+            queryset = queryset.filter(section__name=section)
         if search_query:
-            queryset = queryset.filter(Q(title__icontains=search_query) | Q(author__icontains=search_query))
+            # Full-text index instead of a LIKE '%...%' scan; see search.py.
+            queryset = search_books(queryset, search_query)
         return queryset
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def rent(self, request, pk=None):
-        try:
-            book = self.get_object()
-            if not book.available:
-                return Response({'message': 'Book is already unavailable.'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            due_date = request.data.get('due_date')
-            if not due_date:
-                return Response({'error': 'Return date is required.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            book.available = False
-            book.save()
-            BookBorrow.objects.create(book=book, user=request.user, due_date=due_date)
-            return Response({'message': f'You have successfully borrowed "{book.title}". Best of luck!'})
-        except Book.DoesNotExist:
-            return Response({'error': 'Book not found.'}, status=status.HTTP_4D_NOT_FOUND)
+        """
+        Checks the book out with one conditional UPDATE (see circulation.py):
+        of concurrent calls for the same copy exactly one gets 200, the
+        others 409.
+        """
+        due_date = request.data.get('due_date')
+        if not due_date:
+            return Response({'error': 'Return date is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        due_date = serializers.DateField().run_validation(due_date)
+
+        pk = book_id(pk)
+        outcome, _ = circulation.checkout(pk, request.user, due_date)
+        if outcome == circulation.NOT_FOUND:
+            return Response({'error': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if outcome == circulation.UNAVAILABLE:
+            return Response({'message': 'Book is already unavailable.'}, status=status.HTTP_409_CONFLICT)
+        title = Book.objects.filter(pk=pk).values_list('title', flat=True).first()
+        return Response({'message': f'You have successfully borrowed "{title}". Best of luck!'})
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='return')
+    def return_book(self, request, pk=None):
+        """
+        Returns the caller's copy (staff may return anyone's): the open
+        BookBorrow becomes RETURNED and the book available, in one short
+        transaction. 409 if there is no open borrow to close.
+        """
+        pk = book_id(pk)
+        outcome = circulation.return_book(pk, user=None if request.user.is_staff else request.user)
+        if outcome == circulation.NOT_FOUND:
+            return Response({'error': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if outcome == circulation.NOT_BORROWED:
+            return Response({'message': 'This book is not borrowed by you.'}, status=status.HTTP_409_CONFLICT)
+        title = Book.objects.filter(pk=pk).values_list('title', flat=True).first()
+        return Response({'message': f'Thank you for returning "{title}".'})
+
+    def batch_borrower(self, request, username):
+        """The user a batch is for: the caller, or (staff only) the student named by `username`."""
+        if not username or username == request.user.username:
+            return request.user
+        if not request.user.is_staff:
+            raise PermissionDenied('Only staff can rent or return books for another user.')
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise ValidationError({'username': 'No such user.'})
+        return user
+
+    def batch_response(self, results):
+        return Response({
+            'succeeded': sum(outcome == circulation.DONE for _, outcome, _ in results),
+            'results': [{'book_id': book_id, 'title': title, 'result': outcome} for book_id, outcome, title in results],
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated], url_path='batch-rent')
+    def batch_rent(self, request):
+        """
+        Checks out a list of books in one transaction and a fixed number of
+        statements: {"book_ids": [...], "due_date": ..., "username": ...}.
+        Each book gets its own result (done / unavailable / not_found);
+        one unavailable book doesn't stop the others.
+        """
+        params = BatchRentSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        borrower = self.batch_borrower(request, params.validated_data.get('username'))
+        return self.batch_response(circulation.checkout_many(
+            params.validated_data['book_ids'], borrower, params.validated_data['due_date']))
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated], url_path='batch-return')
+    def batch_return(self, request):
+        """
+        Returns a list of books in one transaction: {"book_ids": [...]}.
+        Students return their own copies; staff return whoever has them,
+        or only `username`'s copies if given. Per-book results are done /
+        not_borrowed / not_found.
+        """
+        params = BatchReturnSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        username = params.validated_data.get('username')
+        if request.user.is_staff and not username:
+            borrower = None
+        else:
+            borrower = self.batch_borrower(request, username)
+        return self.batch_response(circulation.return_many(params.validated_data['book_ids'], user=borrower))
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def raise_request(self, request, pk=None):
@@ -166,6 +331,98 @@ class BookViewSet(viewsets.ModelViewSet):
         except Book.DoesNotExist:
             return Response({'error': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def suggest(self, request):
+        """
+        Typeahead: `?q=` (partial, typos allowed) -> top `?limit=` (default 8,
+        max 20) books as {id, title, author}, from the in-memory index.
+        """
+        query = request.query_params.get('q', '')
+        limit = int_param(request.query_params, 'limit', 8, 1, 20)
+        return Response({'results': SUGGEST_INDEX.suggest(query, limit)})
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], url_path='semantic-search')
+    def semantic_search(self, request):
+        """
+        Ranked search for `?q=`: FAISS similarity fused with the full-text
+        score (see hybrid_search.py). `?k=` results (default 10, max 50)
+        starting at `?offset=`, optionally filtered by `?available=`,
+        `?section=` and `?category=`. Only the full-text side runs while the
+        model or index is unavailable (`"semantic": false`).
+        """
+        params = request.query_params
+        text = params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'This parameter is required.'})
+        k = int_param(params, 'k', 10, 1, 50)
+        offset = int_param(params, 'offset', 0, 0, 1000)
+        available = params.get('available')
+        if available is not None:
+            if available.lower() not in BOOLEAN_PARAMS:
+                raise ValidationError({'available': 'Must be true or false.'})
+            available = BOOLEAN_PARAMS[available.lower()]
+        section, category = params.get('section'), params.get('category')
+        queryset = filter_books(Book.objects.all(), available, section, category)
+        filtered = available is not None or bool(section) or bool(category)
+
+        model = get_model()
+        index = INDEX_MANAGER.get()
+        try:
+            vector = query_embedding(model, text) if model is not None and index is not None else None
+            hits, has_more = hybrid_search(queryset, text, k, offset, index=index, vector=vector, filtered=filtered)
+        except Exception as e:
+            logger.error(f"Semantic search failed, answering from the full-text index only: {e}")
+            vector = None
+            hits, has_more = hybrid_search(queryset, text, k, offset)
+
+        related, columns = book_columns(BookListSerializer.Meta.fields)
+        books = Book.objects.select_related(*related).only(*columns).in_bulk([hit[0] for hit in hits])
+        results = [
+            {**BookListSerializer(books[book_id]).data,
+             'score': score, 'vector_distance': distance, 'lexical_score': relevance}
+            for book_id, score, distance, relevance in hits
+            if book_id in books  # still in the index, but deleted since
+        ]
+        return Response({
+            'results': results,
+            'k': k,
+            'offset': offset,
+            'next_offset': offset + k if has_more else None,
+            'semantic': vector is not None,
+        })
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def similar(self, request, pk=None):
+        """
+        "More like this": the `?limit=` (default SIMILAR_BOOKS_COUNT) nearest
+        books to this one, from the lists precomputed by books/similar.py.
+        Books without a list yet (e.g. just added) are searched live with
+        their vector read back from the index.
+        """
+        pk = book_id(pk)
+        limit = int_param(request.query_params, 'limit', settings.SIMILAR_BOOKS_COUNT, 1, 50)
+        related, columns = book_columns(BookListSerializer.Meta.fields, 'similar__')
+        rows = list(SimilarBook.objects.filter(book_id=pk).select_related('similar', *related)
+                    .only('distance', 'similar', *columns)
+                    .order_by('rank')[:limit])
+        if rows:
+            neighbours = [(row.similar, row.distance) for row in rows]
+            precomputed = True
+        else:
+            if not Book.objects.filter(pk=pk).exists():
+                return Response({'error': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
+            index = INDEX_MANAGER.get()
+            vector = index_vector(index, pk) if index is not None else None
+            hits = nearest(index, [pk], vector, limit)[pk] if vector is not None else []
+            related, columns = book_columns(BookListSerializer.Meta.fields)
+            books = Book.objects.select_related(*related).only(*columns).in_bulk([book_id for book_id, _ in hits])
+            neighbours = [(books[book_id], distance) for book_id, distance in hits if book_id in books]
+            precomputed = False
+        return Response({
+            'results': [{**BookListSerializer(book).data, 'distance': distance} for book, distance in neighbours],
+            'precomputed': precomputed,
+        })
+
     # --- THIS IS THE NEW CHAT ACTION ---
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def chat(self, request):
@@ -173,20 +430,21 @@ class BookViewSet(viewsets.ModelViewSet):
         if not user_query:
             return Response({'reply': 'Please ask a question.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if MODEL is None or INDEX is None:
+        model = get_model()
+        index = INDEX_MANAGER.get()
+        if model is None or index is None:
             logger.error("Chatbot: Model or Index not loaded.")
             return Response({'reply': 'Sorry, the AI search is currently offline.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         try:
-            # 1. Convert user query to a vector
-            query_vector = MODEL.encode([user_query])
-            
-            # 2. Search the FAISS index (k=3 means find top 3 matches)
-            distances, indices = INDEX.search(query_vector, k=3)
+            # 1 + 2. Convert the query to a vector and search the FAISS index
+            # (k=3 means find top 3 matches). The batcher does both together
+            # with any other chat queries arriving at the same moment.
+            distances, indices = CHAT_BATCHER.search(user_query, k=3)
             
             # 3. Get the Book IDs from the search results
             # We filter out any -1s which mean no match
-            book_ids = [idx for idx in indices[0] if idx != -1]
+            book_ids = [int(idx) for idx in indices if idx != -1]
             
             if not book_ids:
                 return Response({'reply': "I couldn't find any books that match your request. Try rephrasing your question."})
@@ -194,7 +452,7 @@ class BookViewSet(viewsets.ModelViewSet):
             # 4. Fetch the matching books from your MySQL database
             # We use a trick to keep them in the order FAISS gave us
             preserved_order = models.Case(*[models.When(id=pk, then=pos) for pos, pk in enumerate(book_ids)])
-            matched_books = Book.objects.filter(id__in=book_ids).order_by(preserved_order)
+            matched_books = Book.objects.filter(id__in=book_ids).only('title', 'author', 'location').order_by(preserved_order)
 
             # 5. Build a friendly response
             response_text = "Based on your request, I found these books for you:\n\n"
@@ -212,24 +470,44 @@ class BookViewSet(viewsets.ModelViewSet):
 class AdminDashboardViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminUser]
 
+    def paginated_response(self, request, queryset, serializer_class, ordering):
+        # Plain ViewSets don't paginate on their own, so each list does it here.
+        paginator = AdminListPagination()
+        paginator.ordering = ordering
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(serializer_class(page, many=True).data)
+
     @action(detail=False, methods=['get'])
     def overdue_books(self, request):
         today = timezone.now().date()
-        overdue_records = BookBorrow.objects.filter(due_date__lt=today, status='BORROWED')
-        serializer = OverdueBookSerializer(overdue_records, many=True)
-        return Response(serializer.data)
+        overdue_records = (BookBorrow.objects.filter(due_date__lt=today, status='BORROWED')
+                           .select_related('book', 'user')
+                           .only('borrowed_date', 'due_date', 'book__title', 'user__username'))
+        return self.paginated_response(request, overdue_records, OverdueBookSerializer, 'id')
+
+    @action(detail=False, methods=['get'])
+    def index_stats(self, request):
+        """Reload counters/timings of the chat index plus batching, cache and typeahead index stats."""
+        return Response({
+            **INDEX_MANAGER.stats(),
+            'chat_batcher': CHAT_BATCHER.stats(),
+            'chat_cache': CHAT_CACHE.stats(),
+            'suggest_index': SUGGEST_INDEX.stats(),
+        })
 
     @action(detail=False, methods=['get'])
     def raised_queries(self, request):
-        pending_queries = StudentQuery.objects.filter(status='PENDING')
-        serializer = StudentQuerySerializer(pending_queries, many=True)
-        return Response(serializer.data)
+        pending_queries = (StudentQuery.objects.filter(status='PENDING')
+                           .select_related('user').only('query_text', 'status', 'created_at', 'user__username'))
+        return self.paginated_response(request, pending_queries, StudentQuerySerializer, 'id')
         
     @action(detail=False, methods=['get'])
     def pending_requests(self, request):
-        requests = BookRequest.objects.filter(status='PENDING').order_by('-request_date')
-        serializer = BookRequestSerializer(requests, many=True)
-        return Response(serializer.data)
+        # Newest first. request_date is set on insert, so '-id' gives the same
+        # order on an indexed, unique key.
+        requests = (BookRequest.objects.filter(status='PENDING')
+                    .select_related('book', 'user').only('request_date', 'status', 'book__title', 'user__username'))
+        return self.paginated_response(request, requests, BookRequestSerializer, '-id')
 
     @action(detail=True, methods=['post'], url_path='update-request-status/(?P<request_id>[0-9]+)')
     def update_request_status(self, request, pk=None, request_id=None):
@@ -241,16 +519,31 @@ class AdminDashboardViewSet(viewsets.ViewSet):
                 return Response({'error': 'Invalid status provided.'}, status=status.HTTP_400_BAD_REQUEST)
 
             book_request.status = new_status
-            book_request.save()
+            book_request.save(update_fields=['status'])
             
             # If approved, make the book available again
             if new_status == 'APPROVED':
-                book_request.book.available = True
-                book_request.book.save()
+                Book.objects.filter(pk=book_request.book_id).update(available=True)
 
             return Response({'message': f'Request has been {new_status.lower()}.'})
         except BookRequest.DoesNotExist:
-            return Response({'error': 'Request not found.'}, status=status.HTTP_44_NOT_FOUND)
+            return Response({'error': 'Request not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=False, methods=['post'], url_path='bulk-update-request-status')
+    def bulk_update_request_status(self, request):
+        """
+        Approves or rejects many pending requests at once:
+        {"request_ids": [...], "status": "APPROVED" | "REJECTED"}. One
+        transaction with set-based UPDATEs, see circulation.moderate_requests.
+        Per-request results are done / not_pending / not_found.
+        """
+        params = BulkRequestStatusSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        results = circulation.moderate_requests(params.validated_data['request_ids'], params.validated_data['status'])
+        return Response({
+            'succeeded': sum(outcome == circulation.DONE for _, outcome in results),
+            'results': [{'request_id': request_id, 'result': outcome} for request_id, outcome in results],
+        })
 
 
 # --- ProfileViewSet ---
@@ -260,7 +553,7 @@ class ProfileViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def me(self, request):
         try:
-            profile, created = StudentProfile.objects.get_or_create(user=request.user)
+            profile, created = StudentProfile.objects.select_related('user').get_or_create(user=request.user)
             if created:
                 logger.info(f"Created a new profile for user: {request.user.username}")
             serializer = StudentProfileSerializer(profile)
@@ -270,4 +563,18 @@ class ProfileViewSet(viewsets.ViewSet):
             return Response(
                 {'error': 'An internal server error occurred while fetching the profile.'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+    @action(detail=False, methods=['get'])
+    def recommendations(self, request):
+        """
+        The user's `?limit=` (default RECOMMENDATIONS_COUNT) best books,
+        precomputed by `manage.py train_recommender` (see books/recommender.py).
+        One query; no model runs here.
+        """
+        limit = int_param(request.query_params, 'limit', settings.RECOMMENDATIONS_COUNT, 1, 50)
+        related, columns = book_columns(BookListSerializer.Meta.fields, 'book__')
+        rows = (RecommendedBook.objects.filter(user=request.user).select_related('book', *related)
+                .only('score', 'book', *columns)
+                .order_by('rank')[:limit])
+        return Response({'results': [{**BookListSerializer(row.book).data, 'score': row.score} for row in rows]})
\ No newline at end of file
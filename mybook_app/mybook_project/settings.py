@@ -93,6 +93,31 @@ REST_FRAMEWORK = {
     ],
 }
 
+# AI chat search: concurrent chat queries are held for up to
+# CHAT_BATCH_WINDOW_MS (or until CHAT_BATCH_MAX_SIZE are waiting) and then
+# encoded/searched in a single batch.
+CHAT_BATCH_MAX_SIZE = int(os.environ.get('CHAT_BATCH_MAX_SIZE', 32))
+CHAT_BATCH_WINDOW_MS = float(os.environ.get('CHAT_BATCH_WINDOW_MS', 5))
+# Max entries in each of the chat query-embedding and result LRU caches.
+CHAT_CACHE_SIZE = int(os.environ.get('CHAT_CACHE_SIZE', 1024))
+# Search-time accuracy/speed knobs for approximate indexes built with
+# `generate_embeddings --index-type ivf|ivfpq|hnsw` (ignored for 'flat').
+FAISS_NPROBE = int(os.environ.get('FAISS_NPROBE', 16))
+FAISS_EF_SEARCH = int(os.environ.get('FAISS_EF_SEARCH', 64))
+# How Book.embedding is stored: 'float32' (exact), 'float16' or 'int8' (smaller, lossy).
+EMBEDDING_STORAGE_DTYPE = os.environ.get('EMBEDDING_STORAGE_DTYPE', 'float32')
+# Each process rebuilds its in-memory typeahead index (/api/books/suggest/)
+# once it is this many seconds old, to pick up edits made by other processes.
+SUGGEST_INDEX_MAX_AGE = float(os.environ.get('SUGGEST_INDEX_MAX_AGE', 300))
+# Neighbours precomputed per book for /api/books/{id}/similar/ (see books/similar.py).
+SIMILAR_BOOKS_COUNT = int(os.environ.get('SIMILAR_BOOKS_COUNT', 10))
+# Recommendations stored per user by `train_recommender` (see books/recommender.py).
+RECOMMENDATIONS_COUNT = int(os.environ.get('RECOMMENDATIONS_COUNT', 10))
+# Most books accepted by one /api/books/batch-rent/ or batch-return/ call.
+CIRCULATION_BATCH_MAX_SIZE = int(os.environ.get('CIRCULATION_BATCH_MAX_SIZE', 100))
+# Most book requests approved/rejected by one bulk moderation call.
+MODERATION_BATCH_MAX_SIZE = int(os.environ.get('MODERATION_BATCH_MAX_SIZE', 500))
+
 # CORS settings for frontend communication
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
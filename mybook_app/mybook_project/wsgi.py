@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mybook_project.settings')
 
 application = get_wsgi_application()
+
+# Build the in-memory typeahead index (books/suggest_index.py) in the
+# background, so the first /api/books/suggest/ request doesn't wait for it.
+# Safe with gunicorn --preload: forked workers keep a finished copy and
+# restart an unfinished build themselves (see SuggestIndex._after_fork).
+from books.suggest_index import SUGGEST_INDEX  # noqa: E402
+
+SUGGEST_INDEX.warm_up()